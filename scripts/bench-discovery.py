@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+import json
+import time
+import tempfile
+import argparse
+import utils.repo
+from utils import *
+from utils.standin import *
+
+def timed(fn: Callable[[], T]) -> tuple[T, float]:
+  start = time.perf_counter()
+  result = fn()
+  return result, time.perf_counter() - start
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(
+    description="Benchmark repository discovery, curation, and merging against a GitHub API stand-in")
+  parser.add_argument('-n', '--repos', type=int, default=2000,
+    help='number of synthetic repositories')
+  parser.add_argument('-i', '--indexed', type=float, default=0.5,
+    help='fraction of the repositories which are already indexed')
+  parser.add_argument('-s', '--seed', type=int, default=0,
+    help='random seed for synthetic repositories and injected faults')
+  parser.add_argument('-f', '--fixtures', type=str, default=None,
+    help='JSON file of recorded responses to replay')
+  parser.add_argument('--query-jobs', type=int, default=1,
+    help='number of concurrent GitHub GraphQL requests')
+  parser.add_argument('--latency', type=float, default=0.05,
+    help='mean injected latency of a response (in seconds)')
+  parser.add_argument('--failure-rate', type=float, default=0,
+    help='fraction of requests to fail with a 502')
+  parser.add_argument('--node-latency', type=float, default=0,
+    help='injected latency per repository of a GraphQL response (in seconds)')
+  parser.add_argument('--partial-failure-rate', type=float, default=0,
+    help='fraction of repositories in GraphQL responses to fail with an error')
+  parser.add_argument('--code-search-limit', type=int, default=1000,
+    help='code search requests allowed per minute by the stand-in')
+  parser.add_argument('--request-rate', type=float, default=100,
+    help='requests per second allowed by the client-side rate governor')
+  parser.add_argument('-o', '--output', type=str, default=None,
+    help='file to write the benchmark results to as JSON')
+  parser.add_argument('-q', '--quiet', dest="verbosity", action='store_const', const=0, default=1,
+    help='print no logging information')
+  parser.add_argument('-v', '--verbose', dest="verbosity", action='store_const', const=2,
+    help='print verbose logging information')
+  args = parser.parse_args()
+
+  configure_logging(args.verbosity)
+
+  # Start stand-in and point the GitHub client at it
+  repos = synthesize_repos(args.repos, args.seed)
+  fixtures = GitHubStandIn.load_fixtures(args.fixtures) if args.fixtures is not None else {}
+  rate_limits = {**STANDIN_RATE_LIMITS, 'code_search': (args.code_search_limit, 60)}
+  standin = GitHubStandIn(
+    repos, fixtures, None, args.latency, args.failure_rate, rate_limits, args.seed,
+    args.node_latency, args.partial_failure_rate)
+  url = standin.start()
+  utils.repo.GH_API_URL = url
+  GH_API_GOVERNOR.rate = GH_API_GOVERNOR.burst = args.request_rate
+  REFDATA.cache_dir = tempfile.mkdtemp()
+  REFDATA.register(LICENSES_REFDATA_NAME, lambda: fetch_licenses(f"{url}/licenses.json"), 0)
+
+  # Discovery and curation (as in `testbed-create`)
+  num_indexed = int(len(repos) * args.indexed)
+  indexed_repos = [r['repo'] for r in repos[:num_indexed]]
+  new_repos, discovery_time = timed(lambda: query_new_repos(
+    -1, set(r['id'] for r in indexed_repos), set(), args.query_jobs))
+
+  # Merging indexed repositories (as in `testbed-save`)
+  pkgs = [package_of_repo(cast(Repo, repo)) for repo in indexed_repos]
+  for pkg in pkgs[::4]: # make some metadata stale
+    pkg['updatedAt'] = '2000-01-01T00:00:00Z'
+  def merge():
+    probes = query_repo_probes((r['id'] for r in indexed_repos), args.query_jobs)
+    changed = [pkg for pkg in pkgs if repo_probe_changed(pkg, probes[cast(str, github_repo_id(pkg))])]
+    changed_repos = query_repos((cast(str, github_repo_id(pkg)) for pkg in changed), args.query_jobs)
+    for pkg in pkgs:
+      repo = changed_repos.get(cast(str, github_repo_id(pkg)), None)
+      if repo is not None:
+        add_repo_metadata(pkg, repo)
+      else:
+        pkg['stars'] = probes[cast(str, github_repo_id(pkg))]['stargazerCount']
+    return changed
+  changed, merge_time = timed(merge)
+  standin.stop()
+
+  results = {
+    'repos': len(repos),
+    'discovery': {
+      'seconds': round(discovery_time, 3),
+      'candidates': len(repos) - num_indexed,
+      'curated': len(new_repos),
+      'reposPerSecond': round((len(repos) - num_indexed) / discovery_time, 1),
+    },
+    'merge': {
+      'seconds': round(merge_time, 3),
+      'packages': len(pkgs),
+      'changed': len(changed),
+      'packagesPerSecond': round(len(pkgs) / merge_time, 1) if merge_time > 0 else None,
+    },
+    'client': GH_API_GOVERNOR.metrics(),
+    'server': dict(standin.requests),
+  }
+  GH_API_GOVERNOR.log_metrics()
+  logging.info(f"Discovery: {results['discovery']['reposPerSecond']} repos/s; merge: {results['merge']['packagesPerSecond']} packages/s")
+  if args.output is None:
+    print(json.dumps(results, indent=2))
+  else:
+    with open(args.output, 'w') as f:
+      json.dump(results, f, indent=2)
@@ -1,9 +1,12 @@
 #!/usr/bin/env python3
 from utils import *
+from typing import TextIO
 import argparse
+import hashlib
 import json
+import sys
 
-def mk_dependent(pkg: SerialPackage, dep: Dependency) -> Dependent:
+def mk_dependent(pkg: PackageMetadata, dep: Dependency) -> Dependent:
   return {
     'type': dep['type'],
     'name': pkg['name'],
@@ -16,64 +19,355 @@ def mk_dependent(pkg: SerialPackage, dep: Dependency) -> Dependent:
     'url': dep.get('url', None),
   }
 
-def bundle_index(path: str):
+def unload_package(pkg: Package):
+  if isinstance(pkg, LazyPackage):
+    pkg.unload()
+
+#---
+# JSON encoding
+#---
+
+class RawJSON(str):
+  """JSON text which has already been encoded (e.g., by `encode_json`)."""
+
+def encode_json(value: Any, compact: bool = False) -> str:
+  if isinstance(value, RawJSON):
+    return value
+  elif compact:
+    return json.dumps(value, separators=(',', ':'))
+  else:
+    return json.dumps(value, indent=2)
+
+def nest_json(encoded: str, depth: int, compact: bool = False) -> str:
+  """Indent encoded JSON so that it can be nested `depth` levels deep."""
+  return encoded if compact else encoded.replace('\n', '\n' + '  ' * depth)
+
+def encode_fields(fields: Iterable[tuple[str, str]], compact: bool = False) -> str:
+  """Encode an object from its already-encoded field values, exactly as `encode_json` would."""
+  if compact:
+    return '{' + ','.join(f"{json.dumps(k)}:{v}" for k, v in fields) + '}'
+  body = ',\n  '.join(f"{json.dumps(k)}: {nest_json(v, 1)}" for k, v in fields)
+  return '{}' if body == '' else '{\n  ' + body + '\n}'
+
+#---
+# Fragment cache
+#---
+
+BUNDLE_FRAGMENT_VERSION = '1'
+
+# Stands in for a package's dependents in a cached fragment
+# (a raw NUL never occurs in encoded JSON)
+DEPENDENTS_HOLE = '\0'
+
+class FragmentCache:
+  """
+  A directory of encoded package fragments named by the content hash of
+  everything that goes into them (other than the package's dependents).
+  Fragments unused by a bundle are pruned once it completes.
+  """
+  dir: str
+  used: set[str]
+  hits: int
+
+  def __init__(self, dir: str) -> None:
+    self.dir = dir
+    self.used = set()
+    self.hits = 0
+    os.makedirs(dir, exist_ok=True)
+
+  def get(self, key: str) -> str | None:
+    self.used.add(key)
+    try:
+      with open(os.path.join(self.dir, f"{key}.frag"), 'r') as f:
+        frag = f.read()
+    except FileNotFoundError:
+      return None
+    self.hits += 1
+    return frag
+
+  def put(self, key: str, frag: str):
+    self.used.add(key)
+    write_if_changed(os.path.join(self.dir, f"{key}.frag"), frag)
+
+  def prune(self):
+    for entry in os.scandir(self.dir):
+      if entry.name.endswith('.frag') and entry.name.removesuffix('.frag') not in self.used:
+        os.remove(entry.path)
+
+def fragment_key(pkg: LazyPackage, resolved_deps: list[str | None], salt: bytes) -> str:
+  h = hashlib.sha256(salt)
+  for file in PACKAGE_FILES:
+    try:
+      with open(os.path.join(pkg.pkg_dir, file), 'rb') as f:
+        h.update(f.read())
+    except FileNotFoundError:
+      pass
+    h.update(b'\0')
+  h.update(json.dumps(resolved_deps).encode())
+  return h.hexdigest()
+
+def encode_fragment(pkg: SerialPackage, compact: bool = False) -> str:
+  fields = ((k, DEPENDENTS_HOLE if k == 'dependents' else encode_json(v, compact)) for k, v in pkg.items())
+  return encode_fields(fields, compact)
+
+def fragment_builds(frag: str) -> list[Build]:
+  """Decode the builds of the serialized package encoded in a fragment."""
+  return json.loads(frag.replace(DEPENDENTS_HOLE, '[]'))['builds']
+
+def fill_fragment(frag: str, dependents: list[Dependent], compact: bool = False) -> RawJSON:
+  return RawJSON(frag.replace(DEPENDENTS_HOLE, nest_json(encode_json(dependents, compact), 1, compact)))
+
+#---
+# Bundling
+#---
+
+def bundle_index(
+    path: str, workers: int | None = 1, cache: str | None = None,
+    fragments: str | None = None, compact: bool = False,
+    table: BuildTable | None = None
+  ):
+  """
+  Bundle the index at `path` into a Reservoir manifest.
+  The manifest's `packages` are a generator which serializes each package
+  only once it is reached, so a streaming writer (e.g., `write_manifest`)
+  only ever needs one fully loaded package in memory at a time.
+  If `fragments` is set, it is used as the directory of a `FragmentCache`
+  and the packages are encoded fragments (for a writer using `compact`).
+  If `table` is set, the builds of each package are added to it as the
+  package is reached.
+  """
   # Query toolchains
   toolchains = query_toolchains()
   toolchain_sort_keys = dict((t['name'], toolchain_sort_key(t)) for t in toolchains)
   def build_sort_key(build: Build):
     return toolchain_sort_keys.get(build['toolchain'], MIN_TOOLCHAIN_SORT_KEY)
-  # Serialize index
-  indexed_pkgs, aliases = load_index(path, include_builds=True)
-  pkgs = list[SerialPackage]()
-  pkg_map = dict[str, SerialPackage]()
-  url_map = dict[str, SerialPackage]()
-  for indexed_pkg in indexed_pkgs:
-    pkg = serialize_package(indexed_pkg)
-    pkg['builds'] = sorted(pkg['builds'], key=build_sort_key, reverse=True)
-    pkg_map[pkg['fullName']] = pkg
+  def table_builds(builds: Iterable[Build]) -> list[Build]:
+    # A total order, so the table does not depend on the order builds were recorded in
+    return sorted(builds, reverse=True, key=lambda b:
+      (build_sort_key(b), b['runAt'], b['revision'], ifnone(b.get('url', None), '')))
+  # Load index metadata
+  indexed_pkgs, aliases = load_index(path, workers=workers, cache=cache, lazy=True)
+  pkg_map = dict[str, str]()
+  url_map = dict[str, str]()
+  for pkg in indexed_pkgs:
+    pkg_map[pkg['fullName']] = pkg['fullName']
     src = git_src(pkg)
     if src is not None:
       url = src['gitUrl'].removesuffix('.git')
-      url_map[url] = pkg
-    pkgs.append(pkg)
-  # Compute package dependents
-  for pkg in pkgs:
-    vers = pkg['versions']
-    if len(vers) == 0: continue
+      url_map[url] = pkg['fullName']
+  def resolve_dep(dep: Dependency) -> str | None:
+    full_name = None
+    scope = dep.get('scope', None)
+    if scope is not None:
+      full_name = pkg_map.get(f"{dep['scope']}/{dep['name']}", None)
+    if full_name is None:
+      url = dep.get('url', None)
+      if url is None: return None
+      full_name = url_map.get(url.removesuffix('.git'), None)
+    return full_name
+  # Prepare fragment cache
+  fragment_cache = None if fragments is None else FragmentCache(fragments)
+  fragment_keys = list[str | None]()
+  salt = json.dumps([BUNDLE_FRAGMENT_VERSION, compact, toolchains]).encode()
+  # First pass: compute package dependents and the dependency graph
+  dependents = dict[str, list[Dependent]]()
+  pkg_idxs = dict((pkg['fullName'], idx) for idx, pkg in enumerate(indexed_pkgs))
+  dep_edges = [set[int]() for _ in indexed_pkgs]
+  for idx, pkg in enumerate(indexed_pkgs):
+    resolved_deps = list[str | None]()
     to_add = True
-    for ver in vers:
+    for ver in pkg['versions']:
       deps = ver['dependencies']
       if deps is None: continue
       for dep in deps:
-        dep_pkg = None
-        scope = dep.get('scope', None)
-        if scope is not None:
-          dep_pkg = pkg_map.get(f"{dep['scope']}/{dep['name']}", None)
-          if dep_pkg is not None:
-            dep['fullName'] = dep_pkg['fullName']
-        if dep_pkg is None:
-          url = dep.get('url', None)
-          if url is None: continue
-          dep_pkg = url_map.get(url.removesuffix('.git'), None)
-          if dep_pkg is None: continue
-          dep['fullName'] = dep_pkg['fullName']
-        if to_add:
-          dep_pkg['dependents'].append(mk_dependent(pkg, dep))
+        full_name = resolve_dep(dep)
+        resolved_deps.append(full_name)
+        if full_name is not None and to_add:
+          dependents.setdefault(full_name, []).append(mk_dependent(pkg, dep))
+          dep_idx = pkg_idxs[full_name]
+          if dep_idx != idx:
+            dep_edges[idx].add(dep_idx)
       to_add = False
+    if fragment_cache is not None and isinstance(pkg, LazyPackage):
+      fragment_keys.append(fragment_key(pkg, resolved_deps, salt))
+    else:
+      fragment_keys.append(None)
+    unload_package(pkg)
+  # Compute transitive dependents (in package order)
+  transitive_dependents = dict[str, list[str]]()
+  for pkg, bits in zip(indexed_pkgs, transitive_predecessors(dep_edges)):
+    if bits != 0:
+      transitive_dependents[pkg['fullName']] = [indexed_pkgs[idx]['fullName'] for idx in bitset_members(bits)]
+  # Second pass: serialize packages one at a time
+  def serialize(indexed_pkg: Package) -> SerialPackage:
+    if isinstance(indexed_pkg, LazyPackage):
+      indexed_pkg.include_builds = True
+    pkg = serialize_package(indexed_pkg)
+    pkg['builds'] = sorted(pkg['builds'], key=build_sort_key, reverse=True)
+    for ver in pkg['versions']:
+      deps = ver['dependencies']
+      if deps is None: continue
+      for dep in deps:
+        full_name = resolve_dep(dep)
+        if full_name is not None:
+          dep['fullName'] = full_name
+    unload_package(indexed_pkg)
+    return pkg
+  def serialize_packages() -> Iterator[SerialPackage]:
+    for indexed_pkg in indexed_pkgs:
+      pkg = serialize(indexed_pkg)
+      pkg['dependents'] = dependents.pop(pkg['fullName'], [])
+      if table is not None:
+        table.add_package(pkg['fullName'], table_builds(pkg['builds']))
+      yield pkg
+  def encode_packages() -> Iterator[RawJSON]:
+    assert fragment_cache is not None
+    for indexed_pkg, key in zip(indexed_pkgs, fragment_keys):
+      pkg_dependents = dependents.pop(indexed_pkg['fullName'], [])
+      frag = None if key is None else fragment_cache.get(key)
+      if frag is None:
+        pkg = serialize(indexed_pkg)
+        if table is not None:
+          table.add_package(pkg['fullName'], table_builds(pkg['builds']))
+        frag = encode_fragment(pkg, compact)
+        if key is not None:
+          fragment_cache.put(key, frag)
+      elif table is not None:
+        # the same (deduplicated) builds as `serialize` would produce
+        table.add_package(indexed_pkg['fullName'], table_builds(fragment_builds(frag)))
+      yield fill_fragment(frag, pkg_dependents, compact)
+    fragment_cache.prune()
+    logging.info(f"Reused {fragment_cache.hits} of {len(indexed_pkgs)} cached package fragments")
   # Return manifest
   return {
     'bundledAt': utc_iso_now(),
     'toolchains': toolchains,
-    'packages': pkgs,
+    'packages': serialize_packages() if fragment_cache is None else encode_packages(),
+    'transitiveDependents': transitive_dependents,
     'packageAliases': serialize_aliases(aliases),
   }
 
+def write_manifest(f: TextIO, manifest: dict[str, Any], compact: bool = False):
+  """
+  Write `manifest` as JSON to `f`, writing the elements of any field
+  whose value is an iterator one at a time as they are produced.
+  The output is identical to that of `encode_json(manifest, compact)`.
+  """
+  item_sep, open_sep, close_sep = (',', '', '') if compact else (',\n  ', '\n  ', '\n')
+  elem_sep, elem_open_sep, elem_close_sep = (',', '', '') if compact else (',\n    ', '\n    ', '\n  ')
+  f.write('{')
+  for idx, (key, value) in enumerate(manifest.items()):
+    f.write(item_sep if idx > 0 else open_sep)
+    f.write(json.dumps(key))
+    f.write(':' if compact else ': ')
+    if isinstance(value, Iterator):
+      f.write('[')
+      empty = True
+      for elem in value:
+        f.write(elem_sep if not empty else elem_open_sep)
+        f.write(nest_json(encode_json(elem, compact), 2, compact))
+        empty = False
+      if not empty:
+        f.write(elem_close_sep)
+      f.write(']')
+    else:
+      f.write(nest_json(encode_json(value, compact), 1, compact))
+  if len(manifest) > 0:
+    f.write(close_sep)
+  f.write('}')
+
+#---
+# Sharded output
+#---
+
+def write_atomic(path: str, content: str):
+  """Write `content` to `path` such that readers never see a partially written file."""
+  tmp_path = f"{path}.tmp"
+  with open(tmp_path, 'w') as f:
+    f.write(content)
+  os.replace(tmp_path, path)
+
+def write_hashed(dir: str, prefix: str, content: str) -> str:
+  """Write `content` to a file in `dir` named by its hash and return the file's name."""
+  digest = hashlib.sha256(content.encode()).hexdigest()[:16]
+  name = f"{prefix}.{digest}.json"
+  path = os.path.join(dir, name)
+  if not os.path.exists(path):
+    write_atomic(path, content)
+  return name
+
+def summarize_package(pkg: SerialPackage, shard: str, num_transitive_dependents: int) -> PackageSummary:
+  return {
+    'name': pkg['name'],
+    'owner': pkg['owner'],
+    'fullName': pkg['fullName'],
+    'description': pkg['description'],
+    'keywords': pkg['keywords'],
+    'license': pkg['license'],
+    'updatedAt': pkg['updatedAt'],
+    'stars': pkg['stars'],
+    'latestBuild': pkg['builds'][0] if len(pkg['builds']) > 0 else None,
+    'numDependents': len(pkg['dependents']),
+    'numTransitiveDependents': num_transitive_dependents,
+    'shard': shard,
+  }
+
+def write_shards(out_dir: str, manifest: dict[str, Any], compact: bool = False):
+  """
+  Write `manifest` to `out_dir` as a summary of its packages plus one shard
+  per package with its full data (versions, builds, and dependents).
+  Summary and shards are named by the hash of their contents, and
+  a fixed `index.json` points to the current summary.
+  Outdated summaries and shards are only removed once `index.json`
+  points to the new summary, so readers never follow a broken link.
+  """
+  shard_dir = os.path.join(out_dir, 'packages')
+  os.makedirs(shard_dir, exist_ok=True)
+  transitive_dependents: dict[str, list[str]] = manifest.get('transitiveDependents', {})
+  summaries = list[PackageSummary]()
+  shards = set[str]()
+  for elem in manifest['packages']:
+    pkg: SerialPackage = json.loads(elem) if isinstance(elem, RawJSON) else elem
+    pkg_transitive_dependents = transitive_dependents.get(pkg['fullName'], [])
+    shard_data = cast(dict[str, Any], pkg.copy())
+    shard_data['transitiveDependents'] = pkg_transitive_dependents
+    shard = write_hashed(shard_dir, 'package', encode_json(shard_data, compact))
+    shards.add(shard)
+    summaries.append(summarize_package(pkg, f"packages/{shard}", len(pkg_transitive_dependents)))
+  summary = dict((k, v) for k, v in manifest.items() if k not in ['packages', 'transitiveDependents'])
+  summary['packages'] = summaries
+  summary_file = write_hashed(out_dir, 'summary', encode_json(summary, compact))
+  index = {'bundledAt': manifest['bundledAt'], 'summary': summary_file}
+  write_atomic(os.path.join(out_dir, 'index.json'), encode_json(index, compact))
+  # Remove outdated files (now that nothing points to them)
+  for entry in os.scandir(shard_dir):
+    if entry.name not in shards:
+      os.remove(entry.path)
+  for entry in os.scandir(out_dir):
+    if entry.name.startswith('summary.') and entry.name != summary_file:
+      os.remove(entry.path)
+  logging.info(f"Wrote {len(summaries)} package shards to '{out_dir}'")
+
 if __name__ == "__main__":
   parser = argparse.ArgumentParser()
   parser.add_argument('index',
     help="package index (directory or manifest)")
   parser.add_argument('-o', '--output',
     help='file to output the bundle manifest')
+  parser.add_argument('-S', '--shards', type=str, default=None,
+    help='directory to output a sharded manifest (instead of a single file)')
+  parser.add_argument('-j', '--jobs', type=int, default=1,
+    help='number of worker processes to load the index with (0 for one per CPU)')
+  parser.add_argument('--index-cache', type=str, default=None,
+    help='file to cache parsed index data in between runs')
+  parser.add_argument('--build-table', type=str, default=None,
+    help='file to output a columnar table of all builds')
+  parser.add_argument('--compat', type=str, default=None,
+    help='file to output package-toolchain compatibility bitsets')
+  parser.add_argument('--compact', action='store_true',
+    help='output the manifest without indentation')
+  parser.add_argument('--fragment-cache', type=str, default=None,
+    help='directory to cache serialized packages in between runs')
   parser.add_argument('-q', '--quiet', dest="verbosity", action='store_const', const=0, default=1,
     help='print no logging information')
   parser.add_argument('-v', '--verbose', dest="verbosity", action='store_const', const=2,
@@ -81,9 +375,23 @@ if __name__ == "__main__":
   args = parser.parse_args()
 
   configure_logging(args.verbosity)
-  data = bundle_index(args.index)
-  if args.output is None:
-    print(json.dumps(data, indent=2))
+  if not REFDATA.check_snapshot([releases_refdata_name(DEFAULT_ORIGIN)]):
+    exit(1)
+  table = None if args.build_table is None and args.compat is None else BuildTable()
+  data = bundle_index(args.index, args.jobs or None, args.index_cache, args.fragment_cache, args.compact, table)
+  if args.shards is not None:
+    write_shards(args.shards, data, args.compact)
+  elif args.output is None:
+    write_manifest(sys.stdout, data, args.compact)
+    print()
   else:
     with open(args.output, 'w') as f:
-      f.write(json.dumps(data, indent=2))
+      write_manifest(f, data, args.compact)
+  if table is not None:
+    logging.info(f"{len(table)} builds across {len(table.toolchains.values)} toolchains")
+    if args.build_table is not None:
+      with open(args.build_table, 'w') as f:
+        f.write(encode_json(table.serialize(), compact=True))
+    if args.compat is not None:
+      with open(args.compat, 'w') as f:
+        f.write(encode_json(table.serialize_compatibility(), compact=True))
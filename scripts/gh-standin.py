@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+import os
+import time
+import argparse
+from utils import *
+from utils.standin import *
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(
+    description="Serve a local stand-in for the GitHub API (use with GH_API_URL)")
+  parser.add_argument('-p', '--port', type=int, default=8765,
+    help='port to serve on')
+  parser.add_argument('-n', '--repos', type=int, default=2000,
+    help='number of synthetic repositories to serve')
+  parser.add_argument('-s', '--seed', type=int, default=0,
+    help='random seed for synthetic repositories and injected faults')
+  parser.add_argument('-f', '--fixtures', type=str, default=None,
+    help='JSON file of recorded responses to replay (and to save recordings to)')
+  parser.add_argument('-r', '--record', type=str, nargs='?', const='https://api.github.com', default=None,
+    help='record responses missing from the fixtures by proxying this API')
+  parser.add_argument('--latency', type=float, default=0,
+    help='mean injected latency of a response (in seconds)')
+  parser.add_argument('--failure-rate', type=float, default=0,
+    help='fraction of requests to fail with a 502')
+  parser.add_argument('-q', '--quiet', dest="verbosity", action='store_const', const=0, default=1,
+    help='print no logging information')
+  parser.add_argument('-v', '--verbose', dest="verbosity", action='store_const', const=2,
+    help='print verbose logging information')
+  args = parser.parse_args()
+
+  configure_logging(args.verbosity)
+
+  fixtures = dict[str, Fixture]()
+  if args.fixtures is not None and os.path.exists(args.fixtures):
+    fixtures = GitHubStandIn.load_fixtures(args.fixtures)
+  standin = GitHubStandIn(
+    synthesize_repos(args.repos, args.seed), fixtures, args.record,
+    args.latency, args.failure_rate, seed=args.seed)
+  standin.start(port=args.port)
+  try:
+    while True:
+      time.sleep(3600)
+  except KeyboardInterrupt:
+    pass
+  finally:
+    standin.stop()
+    if args.record is not None and args.fixtures is not None:
+      standin.save_fixtures(args.fixtures)
+      logging.info(f"Saved {len(standin.fixtures)} fixtures to {args.fixtures}")
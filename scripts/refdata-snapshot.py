@@ -0,0 +1,21 @@
+#!/usr/bin/env python3
+import argparse
+from utils import *
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(
+    description="Fetch reference data (e.g., SPDX licenses and Lean releases) and save it to the offline snapshot")
+  parser.add_argument('names', nargs='*',
+    help=f"reference datasets to snapshot (default: all of {', '.join(REFDATA.sources.keys())})")
+  parser.add_argument('-o', '--output', default=REFDATA_SNAPSHOT_DIR,
+    help='directory to save the snapshot in')
+  parser.add_argument('-q', '--quiet', dest="verbosity", action='store_const', const=0, default=1,
+    help='print no logging information')
+  parser.add_argument('-v', '--verbose', dest="verbosity", action='store_const', const=2,
+    help='print verbose logging information')
+  args = parser.parse_args()
+
+  configure_logging(args.verbosity)
+
+  REFDATA.snapshot_dir = args.output
+  REFDATA.save_snapshot(args.names or None)
@@ -4,13 +4,21 @@ import argparse
 import shutil
 import logging
 import json
+import queue
 import tempfile
-from typing import Collection
+import threading
+from typing import Collection, Container
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 from utils import *
 
 MANIFEST_FILE = 'lake-manifest.json'
 TOOLCHAIN_FILE ='lean-toolchain'
 
+# Serializes the steps of concurrent builds which write to caches shared
+# between worktrees (i.e., Elan's toolchains and Mathlib's build cache)
+SHARED_CACHE_LOCK = threading.Lock()
+
 class ReservoirConfig(TypedDict, total=False):
   name: str
   version: str
@@ -30,22 +38,48 @@ def has_mathlib(deps: list[Dependency] | None):
   else:
     return any(dep.get('name', None) == 'mathlib' for dep in deps)
 
+def cached_build(
+    ver: PackageVersion,
+    target_toolchain: str | None,
+    build_cache: Mapping[str, BuildResult]
+    ) -> BuildResult | None:
+  """Return a previous build of the same revision, toolchain, and manifest (if any)."""
+  toolchain = ifnone(target_toolchain, ver['toolchain'])
+  if toolchain is None:
+    return None
+  return build_cache.get(build_cache_key(ver['revision'], toolchain, ver['dependencies']), None)
+
 def try_build(
     ver: PackageVersion,
     build_dir: str | None,
     target_toolchain: str | None,
-    is_mathlib: bool = False
+    is_mathlib: bool = False,
+    build_cache: Mapping[str, BuildResult] = {},
+    dir: str = '.',
+    env: Mapping[str, str] | None = None,
+    cpus: Collection[int] | None = None
     )-> tuple[BuildResult | None, bool]:
+  # Reuse a previous build
+  cached = cached_build(ver, target_toolchain, build_cache)
+  if cached is not None:
+    logging.info(f'Reusing cached build of revision {ver["revision"]} on {cached["toolchain"]} (run at {cached["runAt"]})')
+    return cast(BuildResult, {**cached, 'cached': True}), cached['tested'] is False
+  prefix = () if cpus is None else ('taskset', '--cpu-list', ','.join(map(str, cpus)))
+  def run(*args: str, allow_failure: bool = False):
+    return run_cmd(*prefix, *args, allow_failure=allow_failure, cwd=dir, env=env)
+  def run_shared(*args: str, allow_failure: bool = False):
+    with SHARED_CACHE_LOCK:
+      return run(*args, allow_failure=allow_failure)
   # Reset directory
-  run_cmd('git', 'reset', '--hard')
-  run_cmd('git', 'clean', '-ffdx')
+  run('git', 'reset', '--hard')
+  run('git', 'clean', '-ffdx')
   # Update toolchain
   toolchain = ver['toolchain']
   cross_toolchain = False
   if target_toolchain is not None:
     if ver['toolchain'] != target_toolchain:
       cross_toolchain = True
-      with open(TOOLCHAIN_FILE, 'w') as f:
+      with open(os.path.join(dir, TOOLCHAIN_FILE), 'w') as f:
         f.write(target_toolchain)
         f.write('\n')
   else:
@@ -53,9 +87,9 @@ def try_build(
     if target_toolchain is None:
       logging.error(f"No toolchain configured to build {ver['toolchain']}")
       return None, False
-  # Validate toolchain
+  # Validate toolchain (installing it if necessary)
   try:
-    run_cmd('lake', '--version')
+    run_shared('lake', '--version')
   except CommandError:
     logging.error("Failed to validate Lean/Lake toolchain installation")
     return None, True
@@ -80,16 +114,16 @@ def try_build(
       require_update = cross_toolchain
     if not require_update:
       if uses_mathlib:
-        run_cmd('lake', 'exe', 'cache', 'get', allow_failure=True)
-      require_update = run_cmd('lake', 'build', allow_failure=True) != 0
+        run_shared('lake', 'exe', 'cache', 'get', allow_failure=True)
+      require_update = run('lake', 'build', allow_failure=True) != 0
       if require_update:
         logging.info('Failed to build package (without `lake update`)')
     if require_update:
       logging.info('Updating dependencies and then trying build')
-      run_cmd('lake', 'update')
+      run('lake', 'update')
       if uses_mathlib:
-        run_cmd('lake', 'exe', 'cache', 'get', allow_failure=True)
-      run_cmd('lake', 'build')
+        run_shared('lake', 'exe', 'cache', 'get', allow_failure=True)
+      run('lake', 'build')
     logging.info(f'Successfully built package')
     result['built'] = True
     result['requiredUpdate'] = require_update
@@ -100,7 +134,7 @@ def try_build(
   # Try to pack result
   with tempfile.TemporaryDirectory() as tmp:
     archive = os.path.join(tmp, 'build.barrel')
-    if run_cmd('lake', 'pack', archive, allow_failure=True) != 0:
+    if run('lake', 'pack', archive, allow_failure=True) != 0:
       logging.error('Failed to pack build archive')
     else:
       archive_size = result['archiveSize'] = os.path.getsize(archive)
@@ -109,8 +143,8 @@ def try_build(
         archive_hash = result['archiveHash'] = filehash(archive)
         shutil.move(archive, os.path.join(build_dir, f"{archive_hash}.barrel"))
   # Try test
-  if run_cmd('lake', 'check-test', allow_failure=True) == 0:
-    success = result['tested'] = run_cmd('lake', 'test', allow_failure=True) == 0
+  if run('lake', 'check-test', allow_failure=True) == 0:
+    success = result['tested'] = run('lake', 'test', allow_failure=True) == 0
     if success:
       logging.info(f"Package tests ran successfully")
     else:
@@ -120,25 +154,93 @@ def try_build(
     logging.warning(f"No package test driver found; skipped testing")
   return result, False
 
+def available_cpus() -> list[int]:
+  if hasattr(os, 'sched_getaffinity'):
+    return sorted(os.sched_getaffinity(0))
+  return list(range(os.cpu_count() or 1))
+
+def split_cpus(jobs: int, threads: int) -> list[list[int] | None]:
+  """
+  Split the available CPUs into `jobs` sets of `threads` CPUs (disjoint if there are enough)
+  to pin concurrent builds to with `taskset`. Without `taskset`, builds are not pinned.
+  """
+  if shutil.which('taskset') is None:
+    logging.warning("`taskset` not found; builds will not be pinned to CPUs")
+    return [None] * jobs
+  cpus = available_cpus()
+  return [[cpus[(i * threads + j) % len(cpus)] for j in range(min(threads, len(cpus)))] for i in range(jobs)]
+
+def worktrees_try_builds(
+    ver: PackageVersion,
+    build_dir: str | None,
+    target_toolchains: list[str | None],
+    is_mathlib: bool,
+    build_cache: Mapping[str, BuildResult],
+    cpu_sets: list[list[int] | None],
+    env: Mapping[str, str] | None = None
+    ) -> list[tuple[BuildResult | None, bool]]:
+  """
+  Build `ver` on each target toolchain concurrently (one build per CPU set),
+  each in its own Git worktree of the current working directory at the version's revision.
+  Results are returned in the order of `target_toolchains`.
+  """
+  free_cpus = queue.SimpleQueue[list[int] | None]()
+  for cpus in cpu_sets:
+    free_cpus.put(cpus)
+  def build(toolchain: str | None):
+    if cached_build(ver, toolchain, build_cache) is not None:
+      return try_build(ver, build_dir, toolchain, is_mathlib, build_cache)
+    cpus = free_cpus.get()
+    try:
+      with git_worktree(ver['revision']) as worktree:
+        return try_build(ver, build_dir, toolchain, is_mathlib, build_cache, worktree, env, cpus)
+    finally:
+      free_cpus.put(cpus)
+  with ThreadPoolExecutor(len(cpu_sets)) as executor:
+    return list(executor.map(build, target_toolchains))
+
 def try_add_builds(
     ver: PackageVersion,
     build_dir: str | None,
     target_toolchains: Collection[str | None],
-    is_mathlib: bool = False
+    is_mathlib: bool = False,
+    build_cache: Mapping[str, BuildResult] = {},
+    jobs: int = 1,
+    threads: int | None = None
     ):
+  """
+  Build `ver` on each target toolchain and record the results.
+  If `jobs > 1`, the toolchains are built concurrently in separate worktrees
+  (with toolchain installs and Mathlib cache downloads still run one at a time).
+  If `jobs > 1` or `threads` is set, each build is pinned to its own set of `threads` CPUs
+  (by default, an even split of the CPUs) with Lean limited to as many threads.
+  Pinning is what bounds Lake's own job parallelism, as `LEAN_NUM_THREADS` only limits
+  the threads of each `lean` process.
+  """
   failure = False
   if len(target_toolchains) == 0:
     logging.info("No target toolchains specified; skipping build")
-  for toolchain in target_toolchains:
-    result, toolchain_failure = try_build(ver, build_dir, toolchain, is_mathlib)
+  toolchains = list(target_toolchains)
+  jobs = max(1, min(jobs, len(toolchains)))
+  if jobs > 1 or threads is not None:
+    threads = ifnone(threads, max(1, len(available_cpus()) // jobs))
+    env = {'LEAN_NUM_THREADS': str(threads)}
+    cpu_sets = split_cpus(jobs, threads)
+  else:
+    env, cpu_sets = None, [None]
+  if jobs > 1:
+    results = worktrees_try_builds(ver, build_dir, toolchains, is_mathlib, build_cache, cpu_sets, env)
+  else:
+    results = (try_build(ver, build_dir, toolchain, is_mathlib, build_cache, '.', env, cpu_sets[0]) for toolchain in toolchains)
+  for result, toolchain_failure in results:
     if result is not None: ver['builds'].append(result)
     failure = toolchain_failure or failure
   return failure
 
-def cwd_toolchain():
-  """Return the Lean toolchain of the current working directory."""
+def cwd_toolchain(dir: str = '.'):
+  """Return the Lean toolchain of the current working directory (or `dir`)."""
   try:
-    with open(TOOLCHAIN_FILE, 'r') as f:
+    with open(os.path.join(dir, TOOLCHAIN_FILE), 'r') as f:
       toolchain = f.read().strip()
       if len(toolchain) > 0:
         return normalize_toolchain(toolchain)
@@ -147,30 +249,34 @@ def cwd_toolchain():
   except OSError:
     return None
 
-def cwd_head_revision():
-  """Return the Git revision (in hash form) of the current working directory."""
-  return capture_cmd('git', 'rev-parse', 'HEAD').decode().strip()
+def cwd_head_revision(dir: str = '.'):
+  """Return the Git revision (in hash form) of the current working directory (or `dir`)."""
+  return capture_cmd('git', 'rev-parse', 'HEAD', cwd=dir).decode().strip()
 
-def cwd_manifest() -> Manifest:
+def cwd_manifest(dir: str = '.') -> Manifest:
   try:
-    with open(MANIFEST_FILE, 'r') as f:
+    with open(os.path.join(dir, MANIFEST_FILE), 'r') as f:
       return Manifest(json.load(f))
   except (FileNotFoundError, json.JSONDecodeError) as e:
     logging.error(f'Failed to read manifest: {e}')
     return Manifest()
 
-def cwd_reservoir_config(toolchain: str | None = None) -> ReservoirConfig | None:
+def has_reservoir_config(toolchain: str | None) -> bool:
+  """Whether the Lake of `toolchain` may support `lake reservoir-config`."""
   lake_ver = None if toolchain is None else toolchain_version_number(toolchain)
-  if lake_ver is not None and lake_ver < 12:
+  return lake_ver is None or lake_ver >= 12
+
+def cwd_reservoir_config(toolchain: str | None = None, dir: str = '.') -> ReservoirConfig | None:
+  if not has_reservoir_config(toolchain):
     return None # short-circuit downloading old toolchains
   try:
-    return json.loads(capture_cmd('lake', 'reservoir-config', '1.0.0'))
+    return json.loads(capture_cmd('lake', 'reservoir-config', '1.0.0', cwd=dir))
   except (CommandError, json.JSONDecodeError) as e:
     logging.error(f"Failed to run `lake reservoir-config`: {e}")
     return None
 
-def cwd_commit_date() -> str:
-  return utc_iso_of_timestamp(int(capture_cmd('git', 'show', '-s', '--format=%ct').decode().strip()))
+def cwd_commit_date(dir: str = '.') -> str:
+  return utc_iso_of_timestamp(int(capture_cmd('git', 'show', '-s', '--format=%ct', cwd=dir).decode().strip()))
 
 def cwd_head_tag() -> str | None:
   tag = capture_cmd("git", "describe", "--tags", "--exact-match", "HEAD", allow_failure=True)
@@ -180,20 +286,34 @@ def cwd_head_tag() -> str | None:
 def cwd_checkout(rev: str):
   run_cmd('git', 'checkout', '--detach', "--force", rev)
 
+@contextmanager
+def git_worktree(rev: str) -> Iterator[str]:
+  """
+  Check out `rev` in a temporary Git worktree of the current working directory.
+  Yields the worktree's path and removes the worktree on exit.
+  """
+  with tempfile.TemporaryDirectory() as tmp:
+    worktree = os.path.join(tmp, os.path.basename(tmp)) # unique worktree name
+    run_cmd('git', 'worktree', 'add', '--quiet', '--detach', '--force', worktree, rev)
+    try:
+      yield worktree
+    finally:
+      run_cmd('git', 'worktree', 'remove', '--force', worktree, allow_failure=True)
+
 def cfg_default(cfg: ReservoirConfig | None, key: str, type: type[T], default: V = None) -> T | V:
   return get_type(cfg, key, type, default) if cfg is not None else default
 
-def cwd_licenses(cfg: ReservoirConfig | None) -> list[str]:
+def cwd_licenses(cfg: ReservoirConfig | None, files: Container[str] | None = None) -> list[str]:
   if cfg is None:
-    if os.path.exists('LICENSE'):
+    if os.path.exists('LICENSE') if files is None else 'LICENSE' in files:
       return ['LICENSE']
     else:
       return []
   return cfg.get('licenseFiles', [])
 
-def cwd_readme(cfg: ReservoirConfig | None) -> str | None:
+def cwd_readme(cfg: ReservoirConfig | None, files: Container[str] | None = None) -> str | None:
   if cfg is None:
-    if os.path.exists('README.md'):
+    if os.path.exists('README.md') if files is None else 'README.md' in files:
       return 'README.md'
     else:
       return None
@@ -202,11 +322,155 @@ def cwd_readme(cfg: ReservoirConfig | None) -> str | None:
 
 VERSION_TAG_PATTERN = re.compile(r'v(\d+).*')
 
+class TagMetadata(TypedDict):
+  revision: str
+  date: str
+  toolchain: str | None
+  manifest: Manifest
+  files: set[str]
+
+# Files read from each tag's tree without checking it out
+TAG_FILES = (TOOLCHAIN_FILE, MANIFEST_FILE, 'LICENSE', 'README.md')
+
+def read_tag_refs(dir: str = '.') -> dict[str, tuple[str, str]]:
+  """Read the commit revision and date of every tag with a single `git for-each-ref`."""
+  out = capture_cmd(
+    'git', 'for-each-ref',
+    '--format=%(refname:short)%00%(objectname)%00%(committerdate:unix)%00%(*objectname)%00%(*committerdate:unix)',
+    'refs/tags', cwd=dir)
+  refs = dict[str, tuple[str, str]]()
+  for line in out.decode().splitlines():
+    tag, rev, date, peeled_rev, peeled_date = line.split('\0')
+    if len(peeled_rev) > 0: # annotated tag
+      rev, date = peeled_rev, peeled_date
+    if len(date) > 0:
+      refs[tag] = (rev, utc_iso_of_timestamp(int(date)))
+  return refs
+
+# Headers of `git cat-file --batch --follow-symlinks` for symlinks which could not be followed
+UNFOLLOWED_SYMLINK_HEADERS = (b'symlink', b'dangling', b'loop', b'notdir')
+
+def read_objects(specs: list[str], dir: str = '.') -> list[tuple[str, bytes] | None]:
+  """
+  Read the type and content of the Git objects named by `specs` (e.g., `<rev>:<path>`)
+  with a single `git cat-file --batch`. Symlinks within the repository are followed.
+  Objects which are missing (or are unfollowable symlinks) are `None`.
+  """
+  if len(specs) == 0: return []
+  input = ''.join(f"{spec}\n" for spec in specs).encode()
+  out = capture_cmd('git', 'cat-file', '--batch', '--follow-symlinks', cwd=dir, input=input)
+  objects = list[tuple[str, bytes] | None]()
+  pos = 0
+  for _ in specs:
+    end = out.index(b'\n', pos)
+    header = out[pos:end].split(b' ')
+    pos = end + 1
+    if len(header) == 3: # <oid> <type> <size>
+      size = int(header[2])
+      objects.append((header[1].decode(), out[pos:pos+size]))
+      pos += size + 1
+    elif len(header) == 2 and header[0] in UNFOLLOWED_SYMLINK_HEADERS: # <kind> <size>
+      pos += int(header[1]) + 1
+      objects.append(None)
+    else: # <spec> missing (or ambiguous)
+      objects.append(None)
+  return objects
+
+def batch_tag_metadata(tags: list[str], dir: str = '.') -> dict[str, TagMetadata]:
+  """
+  Extract the Git metadata of each tag without checking any of them out.
+  Tags which could not be resolved are omitted.
+  """
+  refs = read_tag_refs(dir)
+  tags = [tag for tag in tags if tag in refs]
+  objects = iter(read_objects([f"{refs[tag][0]}:{file}" for tag in tags for file in TAG_FILES], dir))
+  metadata = dict[str, TagMetadata]()
+  for tag in tags:
+    files = dict(zip(TAG_FILES, objects))
+    blobs = {file: obj[1] for file, obj in files.items() if obj is not None and obj[0] == 'blob'}
+    toolchain_blob = blobs.get(TOOLCHAIN_FILE, None)
+    toolchain = None if toolchain_blob is None else toolchain_blob.decode().strip()
+    manifest_blob = blobs.get(MANIFEST_FILE, None)
+    try:
+      manifest = Manifest() if manifest_blob is None else Manifest(json.loads(manifest_blob))
+    except json.JSONDecodeError as e:
+      logging.error(f'Failed to read manifest of {tag}: {e}')
+      manifest = Manifest()
+    if manifest_blob is None:
+      logging.error(f"Failed to read manifest of {tag}: no '{MANIFEST_FILE}'")
+    metadata[tag] = {
+      'revision': refs[tag][0],
+      'date': refs[tag][1],
+      'toolchain': normalize_toolchain(toolchain) if toolchain else None,
+      'manifest': manifest,
+      'files': set(file for file, obj in files.items() if obj is not None),
+    }
+  return metadata
+
+def cwd_tag_metadata(dir: str = '.') -> TagMetadata:
+  """Extract the Git metadata of the version checked out in the current working directory (or `dir`)."""
+  return {
+    'revision': cwd_head_revision(dir),
+    'date': cwd_commit_date(dir),
+    'toolchain': cwd_toolchain(dir),
+    'manifest': cwd_manifest(dir),
+    'files': set(file for file in TAG_FILES if os.path.exists(os.path.join(dir, file))),
+  }
+
+def cwd_analyze_version(tag: str, dir: str = '.', meta: TagMetadata | None = None) -> PackageVersion:
+  """
+  Extract the metadata of the version checked out in the current working directory (or `dir`).
+  If the tag's Git metadata `meta` is provided, only `lake reservoir-config`
+  needs the checkout (and only if the version's toolchain supports it).
+  """
+  if meta is None:
+    meta = cwd_tag_metadata(dir)
+  toolchain = meta['toolchain']
+  cfg = cwd_reservoir_config(toolchain, dir)
+  return {
+    'date': meta['date'],
+    'revision': meta['revision'],
+    'tag': tag,
+    'version': cfg_default(cfg, 'version', str, '0.0.0'),
+    'toolchain': toolchain,
+    'platformIndependent': cfg_default(cfg, 'platformIndependent', bool),
+    'license': filter_ws(cfg_default(cfg, 'license', str)),
+    'licenseFiles': cwd_licenses(cfg, meta['files']),
+    'readmeFile': cwd_readme(cfg, meta['files']),
+    'dependencies': meta['manifest'].dependencies,
+    'builds': [],
+  }
+
+def version_needs_checkout(meta: TagMetadata | None) -> bool:
+  return meta is None or has_reservoir_config(meta['toolchain'])
+
+def worktrees_analyze_versions(tags: list[str], metas: dict[str, TagMetadata], jobs: int) -> list[PackageVersion]:
+  """
+  Extract the metadata of each version tag concurrently. Tags which
+  need a checkout are each checked out in their own Git worktree of
+  the current working directory (so at most `jobs` exist at once).
+  Versions are returned in the order of `tags`.
+  """
+  def analyze(tag: str):
+    logging.info(f'Analyzing version tag {tag}')
+    meta = metas.get(tag, None)
+    if not version_needs_checkout(meta):
+      return cwd_analyze_version(tag, '.', meta)
+    with git_worktree(tag) as worktree:
+      return cwd_analyze_version(tag, worktree, meta)
+  with ThreadPoolExecutor(jobs) as executor:
+    return list(executor.map(analyze, tags))
+
 def cwd_analyze(
     out_dir: str,
     cache_builds: bool = False,
     target_toolchains: Collection[str | None] = [],
-    tag_pattern: re.Pattern[str] | None = None
+    tag_pattern: re.Pattern[str] | None = None,
+    jobs: int = 1,
+    known_versions: Iterable[PackageVersionMetadata] = [],
+    build_cache: Mapping[str, BuildResult] = {},
+    build_jobs: int = 1,
+    build_threads: int | None = None
     ) -> tuple[PackageResult, bool]:
   failure = False
   # Extract Reservoir configuration from Lake
@@ -265,30 +529,48 @@ def cwd_analyze(
   build_dir = out_dir if cache_builds else None
   if result['doIndex']:
     if tag_pattern is None:
-      failure = try_add_builds(result['headVersion'], build_dir, target_toolchains, is_mathlib) or failure
+      failure = try_add_builds(result['headVersion'], build_dir, target_toolchains, is_mathlib, build_cache, build_jobs, build_threads) or failure
     if version_tags is not None:
       logging.info(f'Detected version tags: {version_tags}')
+      try:
+        tag_metas = batch_tag_metadata(version_tags)
+      except CommandError as e:
+        logging.error(f'Failed to read version tag metadata: {e}')
+        tag_metas = {}
+      # Reuse the stored metadata of tags which have not moved since they were indexed
+      known = {ver['tag']: ver for ver in known_versions}
+      versions = dict[str, PackageVersion]()
       for tag in version_tags:
-        logging.info(f'Analyzing version tag {tag}')
-        cwd_checkout(tag)
-        toolchain = cwd_toolchain()
-        cfg = cwd_reservoir_config(toolchain)
-        ver: PackageVersion = {
-          'date': cwd_commit_date(),
-          'revision': cwd_head_revision(),
-          'tag': tag,
-          'version': cfg_default(cfg, 'version', str, '0.0.0'),
-          'toolchain': toolchain,
-          'platformIndependent': cfg_default(cfg, 'platformIndependent', bool),
-          'license': filter_ws(cfg_default(cfg, 'license', str)),
-          'licenseFiles': cwd_licenses(cfg),
-          'readmeFile': cwd_readme(cfg),
-          'dependencies': cwd_manifest().dependencies,
-          'builds': [],
-        }
-        result['versions'].append(ver)
-        if tag_pattern is not None and tag_pattern.search(tag) is not None:
-          failure = try_add_builds(ver, build_dir, target_toolchains, is_mathlib) or failure
+        ver, meta = known.get(tag, None), tag_metas.get(tag, None)
+        if ver is not None and meta is not None and ver['revision'] == meta['revision']:
+          versions[tag] = version_of_metadata(version_metadata(ver))
+      if len(versions) > 0:
+        logging.info(f'Reusing metadata of known version tags: {list(versions.keys())}')
+      new_tags = [tag for tag in version_tags if tag not in versions]
+      if jobs > 1 and len(new_tags) > 1:
+        # Extract metadata concurrently, but build serially in the main clone
+        versions.update(zip(new_tags, worktrees_analyze_versions(new_tags, tag_metas, jobs)))
+        for tag in version_tags:
+          ver = versions[tag]
+          result['versions'].append(ver)
+          if tag_pattern is not None and tag_pattern.search(tag) is not None:
+            cwd_checkout(ver['revision'])
+            failure = try_add_builds(ver, build_dir, target_toolchains, is_mathlib, build_cache, build_jobs, build_threads) or failure
+      else:
+        for tag in version_tags:
+          do_build = tag_pattern is not None and tag_pattern.search(tag) is not None
+          ver = versions.get(tag, None)
+          if ver is None:
+            logging.info(f'Analyzing version tag {tag}')
+            meta = tag_metas.get(tag, None)
+            if do_build or version_needs_checkout(meta):
+              cwd_checkout(tag)
+            ver = cwd_analyze_version(tag, meta=meta)
+          elif do_build:
+            cwd_checkout(ver['revision'])
+          result['versions'].append(ver)
+          if do_build:
+            failure = try_add_builds(ver, build_dir, target_toolchains, is_mathlib, build_cache, build_jobs, build_threads) or failure
   return result, failure
 
 if __name__ == "__main__":
@@ -309,6 +591,16 @@ if __name__ == "__main__":
     help="include build archives in artifact")
   parser.add_argument('--no-cache', dest='cache', action='store_false',
     help="do not include build archives in artifact")
+  parser.add_argument('-j', '--jobs', type=int, default=1,
+    help='number of version tags to analyze concurrently (each in its own Git worktree)')
+  parser.add_argument('-J', '--build-jobs', type=int, default=1,
+    help='number of toolchains to build a version on concurrently (each in its own Git worktree)')
+  parser.add_argument('--build-threads', type=int, default=None,
+    help='number of CPUs (and Lean threads) to pin each build to (default: CPUs split evenly among concurrent builds)')
+  parser.add_argument('-F', '--force-builds', action='store_true',
+    help='rebuild package versions even if the known data (`-K`) has builds of them')
+  parser.add_argument('-K', '--known', metavar='PATH', type=str, default=None,
+    help="JSON file of previously analyzed versions (and builds) to reuse for unmoved tags (or a `testbed-create --known-dir` directory)")
   parser.add_argument('-q', '--quiet', dest="verbosity", action='store_const', const=0, default=1,
     help='print no logging information')
   parser.add_argument('-v', '--verbose', dest="verbosity", action='store_const', const=2,
@@ -320,6 +612,9 @@ if __name__ == "__main__":
   args = parser.parse_args()
 
   configure_logging(args.verbosity)
+  toolchains = args.toolchain if args.matrix is None else [json.loads(args.matrix)['toolchains']]
+  if not REFDATA.check_snapshot(toolchain_refdata_names(toolchains)):
+    exit(1)
 
   # Make testbed
   if args.testbed is None:
@@ -355,6 +650,18 @@ if __name__ == "__main__":
       target_toolchains = resolve_toolchains(args.toolchain)
       version_tags = args.version_tags
       cache_builds = args.cache
+    known_versions = list[PackageVersionMetadata]()
+    build_cache = BuildCache()
+    if args.known is not None:
+      known_path = args.known
+      if os.path.isdir(known_path):
+        if args.matrix is None:
+          raise RuntimeError("a directory of known data (`-K`) requires a matrix entry (`--matrix`)")
+        known_path = os.path.join(known_path, f"{entry['artifact']}.json")
+      known = load_known_data(known_path)
+      known_versions = known['versions']
+      if not args.force_builds:
+        build_cache = known['builds']
 
     # Compile version tag regex (if provided)
     tag_pattern: re.Pattern[str] | None = None
@@ -373,7 +680,8 @@ if __name__ == "__main__":
     run_cmd('git', 'fetch', '--tags', '--force')
     if args.head:
       cwd_checkout(args.head)
-    result, failure = cwd_analyze(out_dir, cache_builds, target_toolchains, tag_pattern)
+    result, failure = cwd_analyze(out_dir, cache_builds, target_toolchains, tag_pattern, args.jobs, known_versions, build_cache,
+      args.build_jobs, args.build_threads)
     os.chdir(iwd)
 
     # Output result
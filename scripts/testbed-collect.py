@@ -88,7 +88,7 @@ if __name__ == "__main__":
     if jobId is None:
       logging.error(f"[{entry['jobName']}] Job ID not found")
       continue
-    url = f"https://github.com/{TESTBED_REPO}/actions/runs/{args.run_id}/job/{jobId}#step:4:1"
+    url = f"https://github.com/{TESTBED_REPO}/actions/runs/{args.run_id}/job/{jobId}#step:5:1"
     artifact_dir = os.path.join(args.results, entry['artifact'])
     if not download_artifact(entry['artifact'], artifact_dir, args.run_id, allow_failure=True):
       continue
@@ -105,8 +105,10 @@ if __name__ == "__main__":
       logging.info(f"[{entry['jobName']}] Opted-out of Reservoir")
       num_opt_outs +=1
     for build in walk_builds(result):
-      build['url'] = url
       num_build_results += 1
+      if cast(dict[str, Any], build).pop('cached', False):
+        continue # reused from the index (and already collected)
+      build['url'] = url
       archive_size = build.get('archiveSize', None)
       if archive_size is not None:
         archive_sizes.append(archive_size)
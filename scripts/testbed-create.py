@@ -38,6 +38,51 @@ def create_entry(
     "registrationKey": registration_key,
   }
 
+def index_versions(index: str, pkg: PackageMetadata) -> list[PackageVersionMetadata]:
+  if not os.path.isdir(index):
+    return []
+  relpath = ifnone(pkg['relpath'], package_relpath(cast(Package, pkg)))
+  return load_versions(os.path.join(index, relpath, 'versions.json'))
+
+def known_versions(vers: Iterable[PackageVersionMetadata]) -> list[PackageVersionMetadata]:
+  """The tagged versions of an indexed package, so testbed jobs can skip re-analyzing them."""
+  return [version_metadata(ver) for ver in vers if ver.get('tag', None) is not None]
+
+def build_versions(vers: list[PackageVersionMetadata], version_tags: str) -> list[PackageVersionMetadata]:
+  """The indexed versions a testbed job would build."""
+  if version_tags == '':
+    return vers[:1] # only HEAD is built
+  r = re.compile(version_tags)
+  return [ver for ver in vers if ver['tag'] is not None and r.search(ver['tag']) is not None]
+
+def cached_builds(
+    cache: Mapping[str, BuildCache], vers: list[PackageVersionMetadata],
+    toolchains: str, version_tags: str
+  ) -> BuildCache:
+  """The cached builds of the indexed versions a testbed job would build."""
+  if toolchains == '' or len(vers) == 0:
+    return {}
+  targets = set(toolchains.split(','))
+  vers = build_versions(vers, version_tags)
+  builds = BuildCache()
+  for ver in vers:
+    for key, build in cache.get(ver['revision'], {}).items():
+      if build['toolchain'] in targets or ('package' in targets and build['toolchain'] == ver['toolchain']):
+        builds[key] = build
+  return builds
+
+def builds_cached(builds: Mapping[str, BuildResult], vers: list[PackageVersionMetadata], toolchains: str) -> bool:
+  """Whether `builds` has a build of every version on every target toolchain."""
+  if toolchains == '' or len(vers) == 0:
+    return False
+  for ver in vers:
+    for toolchain in toolchains.split(','):
+      if toolchain == 'package':
+        toolchain = ver['toolchain']
+      if toolchain is None or build_cache_key(ver['revision'], toolchain, ver['dependencies']) not in builds:
+        return False
+  return True
+
 def create_layers(entries: Iterable[TestbedEntry]) -> Iterable[TestbedLayer]:
   for idx, data in enumerate(paginate(entries, 256), 1):
     yield {'name': str(idx), 'data': data}
@@ -58,6 +103,12 @@ if __name__ == "__main__":
     help="max number of testbed entries (< 0 for no limit)")
   parser.add_argument('-Q', '--query', type=int, default=0,
     help='(max) number of new packages to query from GitHub (< 0 for no limit)')
+  parser.add_argument('--search-checkpoint', metavar='FILE',
+    help='file to save GitHub search progress in to resume an interrupted search')
+  parser.add_argument('--known-dir', metavar='DIR',
+    help="directory to write indexed versions and builds of each entry's package to (for `testbed-analyze -K`)")
+  parser.add_argument('-F', '--force-builds', action='store_true',
+    help="rebuild package versions even if the index has a successful build of them")
   parser.add_argument('--cache', action='store_true', default=True,
     help="upload build archives in cloud storage")
   parser.add_argument('--no-cache', dest='cache', action='store_false',
@@ -69,6 +120,18 @@ if __name__ == "__main__":
     help='file containing repos to exclude')
   parser.add_argument('-o', '--output',
     help='file to output the bundle manifest')
+  parser.add_argument('-j', '--jobs', type=int, default=1,
+    help='number of worker processes to load the index with (0 for one per CPU)')
+  parser.add_argument('--index-cache', type=str, default=None,
+    help='file to cache parsed index data in between runs')
+  parser.add_argument('--query-jobs', type=int, default=1,
+    help='number of concurrent GitHub GraphQL requests')
+  parser.add_argument('--gh-cache', metavar='DIR',
+    help='directory to cache GitHub REST API responses in between runs')
+  parser.add_argument('--gh-cache-ttl', type=float, default=0,
+    help='seconds a cached GitHub API response is used without revalidation')
+  parser.add_argument('--gh-cache-swr', type=float, default=0,
+    help='seconds past the TTL a cached GitHub API response is used while revalidating it')
   parser.add_argument('-q', '--quiet', dest="verbosity", action='store_const', const=0, default=1,
     help='print no logging information')
   parser.add_argument('-v', '--verbose', dest="verbosity", action='store_const', const=2,
@@ -76,6 +139,12 @@ if __name__ == "__main__":
   args = parser.parse_args()
 
   configure_logging(args.verbosity)
+  refdata_names = toolchain_refdata_names(args.toolchain)
+  if args.query != 0 or args.registrations_url is not None:
+    refdata_names.append(LICENSES_REFDATA_NAME) # to curate new repositories
+  if not REFDATA.check_snapshot(refdata_names):
+    exit(1)
+  configure_github_cache(args.gh_cache, args.gh_cache_ttl, args.gh_cache_swr)
 
   exclusions = set[str]()
   with open(args.exclusions, 'r') as f:
@@ -95,18 +164,34 @@ if __name__ == "__main__":
 
   # Load index
   if args.index is not None:
-    pkgs = load_index_metadata(args.index)
+    pkgs = load_index_metadata(args.index, args.jobs or None, args.index_cache)
     num_total = len(pkgs)
     logging.info(f"{num_total} total packages in index")
   else:
     pkgs = []
     num_total = 0
 
+  # Load build cache
+  build_cache = dict[str, BuildCache]()
+  if args.known_dir is not None and toolchains != '' and not args.force_builds:
+    if args.index is not None and os.path.isdir(args.index):
+      build_cache = load_build_cache(args.index)
+  known_data = dict[str, TestbedKnownData]()
+  cached_pkgs = set[str]()
+  def add_known_data(pkg: PackageMetadata):
+    if args.known_dir is None:
+      return
+    vers = index_versions(args.index, pkg)
+    builds = cached_builds(build_cache, vers, toolchains, args.version_tags)
+    known_data[pkg['fullName']] = {'versions': known_versions(vers), 'builds': builds}
+    if builds_cached(builds, build_versions(vers, args.version_tags), toolchains):
+      cached_pkgs.add(pkg['fullName'])
+
   # Query new repositories
   limit = ifnone(args.query, 0)
   indexed_repos = set(filter(None, map(github_repo_id, pkgs)))
   try:
-    new_repos = query_new_repos(limit, indexed_repos, exclusions)
+    new_repos = query_new_repos(limit, indexed_repos, exclusions, args.query_jobs, args.search_checkpoint)
     # Add them to the testbed
     for repo in new_repos:
       entries.append(create_entry(
@@ -180,6 +265,7 @@ if __name__ == "__main__":
           pkg['fullName'], git_url,
           toolchains, args.version_tags, cache_builds,
           repo_id, pkg['fullName'], registration_key))
+        add_known_data(pkg)
 
   # Add remaining registrations to the testbed
   if args.registrations_url is not None:
@@ -198,13 +284,14 @@ if __name__ == "__main__":
           pkg['fullName'], src['gitUrl'],
           toolchains, args.version_tags, False,
           repo_id, pkg['fullName'], registration_key))
+        add_known_data(pkg)
         old_registered += 1
     logging.info(f"{old_registered} indexed packages selected from registrations")
     # Curate new registrations and add passing ones to the testbed
     # Fetches repository data on registrations from the GitHub API
     new_registered = 0
     repo_ids = list(reg_by_repo.keys())
-    repos = filter(None, query_repo_data(repo_ids))
+    repos = filter(None, query_repo_data(repo_ids, args.query_jobs))
     for repo in curate_repos(repos, exclusions):
         registration_key, _ = reg_by_repo[repo['id']]
         entries.append(create_entry(
@@ -215,11 +302,31 @@ if __name__ == "__main__":
     logging.info(f"{new_registered} new packages selected from registrations")
 
   # Create layers
+  if GH_API_CACHE is not None:
+    GH_API_CACHE.join()
+  GH_API_GOVERNOR.log_metrics()
+  # Skip packages whose builds would all be reused from the build cache
+  if len(cached_pkgs) > 0:
+    entries = [entry for entry in entries if entry['indexName'] not in cached_pkgs]
+    logging.info(f"{len(cached_pkgs)} packages skipped with all of their builds cached")
   logging.info(f"{len(entries)} total testbed candidates")
   if args.num >= 0:
     entries = itertools.islice(entries, args.num)
   layers = list(create_layers(entries))
 
+  # Output known data on the selected entries' packages
+  if args.known_dir is not None:
+    os.makedirs(args.known_dir, exist_ok=True)
+    num_known = 0
+    for layer in layers:
+      for entry in layer['data']:
+        data = known_data.get(cast(str, entry['indexName']), None)
+        if data is not None:
+          with open(os.path.join(args.known_dir, f"{entry['artifact']}.json"), 'w') as f:
+            f.write(json.dumps(data))
+          num_known += 1
+    logging.info(f"Wrote known data on {num_known} testbed entries to '{args.known_dir}'")
+
   # Output matrix
   matrix: TestbedMatrix = layers
   if args.output is None:
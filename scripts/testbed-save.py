@@ -40,6 +40,14 @@ if __name__ == "__main__":
   parser.add_argument('-R', '--registrations-url', type=str, nargs='?',
     const='https://reservoir.lean-lang.org',
     help="delete processed registrations from the Reservoir API")
+  parser.add_argument('-j', '--jobs', type=int, default=1,
+    help='number of worker processes to load the index with (0 for one per CPU)')
+  parser.add_argument('--index-cache', type=str, default=None,
+    help='file to cache parsed index data in between runs')
+  parser.add_argument('--query-jobs', type=int, default=1,
+    help='number of concurrent GitHub GraphQL requests')
+  parser.add_argument('--full-query', action='store_true',
+    help='query full repository data even for repositories unchanged since the last save')
   parser.add_argument('-q', '--quiet', dest="verbosity", action='store_const', const=0, default=1,
     help='print no logging information')
   parser.add_argument('-v', '--verbose', dest="verbosity", action='store_const', const=2,
@@ -49,7 +57,7 @@ if __name__ == "__main__":
   configure_logging(args.verbosity)
 
   # Load index
-  pkgs, aliases = load_index(args.index)
+  pkgs, aliases = load_index(args.index, workers=args.jobs or None, cache=args.index_cache, lazy=True)
   pkgs = {pkg['fullName']: pkg for pkg in pkgs}
 
   # Load results
@@ -77,7 +85,19 @@ if __name__ == "__main__":
   # Use GitHub repository data to update packages
   repo_pkgs = dict[str, Package]()
   repo_uses = {k: list[str]() for k in repo_results.keys()}
-  repos = query_repos(repo_results.keys())
+  # Cheaply probe indexed repositories for changes,
+  # and only query the full data of changed or new ones
+  probes = dict[str, RepoProbe]()
+  if not args.full_query:
+    indexed_pkgs = dict[str, Package]()
+    for pkg in pkgs.values():
+      id = github_repo_id(pkg)
+      if id is not None and id in repo_results:
+        indexed_pkgs.setdefault(id, pkg)
+    probes = query_repo_probes(indexed_pkgs.keys(), args.query_jobs)
+    probes = {id: probe for id, probe in probes.items() if not repo_probe_changed(indexed_pkgs[id], probe)}
+    logging.info(f"{len(repo_results) - len(probes)} of {len(repo_results)} repositories changed or new")
+  repos = query_repos((id for id in repo_results.keys() if id not in probes), args.query_jobs)
   for pkg in pkgs.values():
     id = github_repo_id(pkg)
     if id is None or id not in repo_results:
@@ -93,11 +113,15 @@ if __name__ == "__main__":
     result = repo_results[id]
     if not repo_results[id]['doIndex']:
       opt_outs.append(pkg)
-    repo = repos.get(id, None)
-    if repo is None:
-      logging.error(f"{pkg['fullName']}: Repository ID '{id}' not found on GitHub")
-      continue
-    add_repo_metadata(pkg, repo)
+    probe = probes.get(id, None)
+    if probe is not None:
+      pkg['stars'] = probe['stargazerCount']
+    else:
+      repo = repos.get(id, None)
+      if repo is None:
+        logging.error(f"{pkg['fullName']}: Repository ID '{id}' not found on GitHub")
+        continue
+      add_repo_metadata(pkg, repo)
     add_result_data(pkg, repo_results[id])
     final_pkgs.append(pkg)
   for id, uses in repo_uses.items():
@@ -108,7 +132,10 @@ if __name__ == "__main__":
         add_result_data(pkg, result)
         final_pkgs.append(pkg)
     elif len(uses) > 1:
-      logging.warning(F"Repository reuse: '{repos[id]['nameWithOwner']}' for {uses}")
+      name = probes[id]['nameWithOwner'] if id in probes else repos[id]['nameWithOwner']
+      logging.warning(F"Repository reuse: '{name}' for {uses}")
+
+  GH_API_GOVERNOR.log_metrics()
 
   # Save index
   write_index(args.index, final_pkgs, aliases)
@@ -0,0 +1,89 @@
+import io
+import os
+import sys
+import json
+import importlib.util
+
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SCRIPTS_DIR)
+spec = importlib.util.spec_from_file_location('bundle', os.path.join(SCRIPTS_DIR, 'bundle.py'))
+assert spec is not None and spec.loader is not None
+bundle = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(bundle)
+
+TOOLCHAINS = [
+  {'name': 'leanprover/lean4:v4.10.0', 'version': 10, 'tag': 'v4.10.0', 'date': '2024-08-01T00:00:00Z', 'releaseUrl': '', 'prerelease': False},
+  {'name': 'leanprover/lean4:v4.9.0', 'version': 9, 'tag': 'v4.9.0', 'date': '2024-07-01T00:00:00Z', 'releaseUrl': '', 'prerelease': False},
+]
+
+def write_json(path: str, data):
+  os.makedirs(os.path.dirname(path), exist_ok=True)
+  with open(path, 'w') as f:
+    json.dump(data, f)
+
+def write_package(index: str, name: str, deps: list[str]):
+  pkg_dir = os.path.join(index, 'foo', name)
+  write_json(os.path.join(pkg_dir, 'metadata.json'), {
+    'name': name, 'owner': 'foo', 'fullName': f"foo/{name}", 'description': None,
+    'keywords': [], 'homepage': None, 'license': 'MIT', 'createdAt': '2024-01-01T00:00:00Z',
+    'updatedAt': '2024-01-01T00:00:00Z', 'stars': 0, 'sources': [], 'schemaVersion': '1.2.0',
+  })
+  dependencies = [{
+    'type': 'git', 'name': dep, 'scope': 'foo', 'version': '0.0.0', 'transitive': False,
+    'rev': 'abc', 'inputRev': 'main', 'url': f"https://github.com/foo/{dep}",
+  } for dep in deps]
+  vers = [{
+    'version': '0.1.0', 'revision': f"{name}1", 'date': '2024-01-01T00:00:00Z', 'tag': 'v0.1.0',
+    'toolchain': 'leanprover/lean4:v4.9.0', 'platformIndependent': None, 'license': 'MIT',
+    'licenseFiles': [], 'readmeFile': None, 'dependencies': dependencies,
+  }]
+  write_json(os.path.join(pkg_dir, 'versions.json'), {'schemaVersion': '1.2.0', 'data': vers})
+  def build(rev: str, toolchain: str, run_at: str) -> dict:
+    return {
+      'url': None, 'built': True, 'tested': None, 'archiveSize': None, 'archiveHash': None,
+      'toolchain': f"leanprover/lean4:{toolchain}", 'requiredUpdate': False, 'revision': rev, 'runAt': run_at,
+    }
+  builds = [
+    build(f"{name}1", 'v4.9.0', '2024-01-02T00:00:00Z'),
+    build(f"{name}1", 'v4.9.0', '2024-01-02T00:00:00Z'), # duplicate (e.g., reused from the build cache)
+    build(f"{name}1", 'v4.10.0', '2024-01-03T00:00:00Z'),
+    build(f"{name}0", 'v4.9.0', '2024-01-01T00:00:00Z'), # of an unindexed revision
+  ]
+  write_json(os.path.join(pkg_dir, 'builds.json'), {'schemaVersion': '1.2.0', 'data': builds})
+
+def run_bundle(index: str, fragments: str | None):
+  table = bundle.BuildTable()
+  buf = io.StringIO()
+  bundle.write_manifest(buf, bundle.bundle_index(index, fragments=fragments, compact=True, table=table), compact=True)
+  manifest = json.loads(buf.getvalue())
+  manifest.pop('bundledAt')
+  return manifest, table.serialize(), table.serialize_compatibility()
+
+def test_fragment_cache_hit_matches_miss(monkeypatch, tmp_path):
+  monkeypatch.setattr(bundle, 'query_toolchains', lambda: TOOLCHAINS)
+  index = str(tmp_path / 'index')
+  write_package(index, 'a', [])
+  write_package(index, 'b', ['a'])
+  fragments = str(tmp_path / 'fragments')
+  uncached = run_bundle(index, None)
+  cold = run_bundle(index, fragments)
+  assert len(os.listdir(fragments)) == 2
+  warm = run_bundle(index, fragments)
+  assert cold == uncached
+  assert warm == uncached
+  assert len(uncached[1]['columns']['runAt']) == 6
+
+def test_write_shards_replaces_outdated_files(monkeypatch, tmp_path):
+  monkeypatch.setattr(bundle, 'query_toolchains', lambda: TOOLCHAINS)
+  index = str(tmp_path / 'index')
+  out = str(tmp_path / 'out')
+  write_package(index, 'a', [])
+  bundle.write_shards(out, bundle.bundle_index(index))
+  write_package(index, 'b', ['a'])
+  bundle.write_shards(out, bundle.bundle_index(index))
+  with open(os.path.join(out, 'index.json')) as f:
+    summary_file = json.load(f)['summary']
+  assert [e for e in os.listdir(out) if e.startswith('summary.')] == [summary_file]
+  with open(os.path.join(out, summary_file)) as f:
+    shards = [pkg['shard'] for pkg in json.load(f)['packages']]
+  assert sorted(os.path.join('packages', e) for e in os.listdir(os.path.join(out, 'packages'))) == sorted(shards)
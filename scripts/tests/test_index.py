@@ -0,0 +1,110 @@
+import os
+import sys
+import json
+
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SCRIPTS_DIR)
+import utils.index
+from utils.index import LazyPackage, build_cache_key, index_relpath, load_build_cache, load_index, mk_builds, write_index
+
+def mk_version(rev: str, tag: str | None = None) -> dict:
+  return {
+    'version': '0.1.0', 'revision': rev, 'date': '2024-01-01T00:00:00Z', 'tag': tag,
+    'toolchain': 'leanprover/lean4:v4.9.0', 'platformIndependent': None, 'license': 'MIT',
+    'licenseFiles': [], 'readmeFile': None, 'dependencies': [],
+  }
+
+def mk_build(rev: str, toolchain: str = 'leanprover/lean4:v4.9.0', built: bool = True, run_at: str = '2024-01-02T00:00:00Z') -> dict:
+  return {
+    'url': None, 'built': built, 'tested': None, 'archiveSize': None, 'archiveHash': None,
+    'toolchain': toolchain, 'requiredUpdate': False, 'revision': rev, 'runAt': run_at,
+  }
+
+def write_package(index: str, owner: str, name: str, vers: list[dict], builds: list[dict] = [], inline_vers: list[dict] | None = None):
+  pkg_dir = os.path.join(index, index_relpath(owner, name))
+  os.makedirs(pkg_dir, exist_ok=True)
+  meta = {
+    'name': name, 'owner': owner, 'fullName': f"{owner}/{name}", 'description': None,
+    'keywords': [], 'homepage': None, 'license': 'MIT', 'createdAt': '2024-01-01T00:00:00Z',
+    'updatedAt': '2024-01-01T00:00:00Z', 'stars': 0, 'sources': [], 'schemaVersion': '1.2.0',
+  }
+  if inline_vers is not None:
+    meta['versions'] = inline_vers
+  with open(os.path.join(pkg_dir, 'metadata.json'), 'w') as f:
+    json.dump(meta, f)
+  with open(os.path.join(pkg_dir, 'versions.json'), 'w') as f:
+    json.dump({'schemaVersion': '1.2.0', 'data': vers}, f)
+  if len(builds) > 0:
+    with open(os.path.join(pkg_dir, 'builds.json'), 'w') as f:
+      json.dump({'schemaVersion': '1.2.0', 'data': builds}, f)
+  return pkg_dir
+
+def test_lazy_index_matches_eager(tmp_path):
+  index = str(tmp_path)
+  write_package(index, 'foo', 'a', [mk_version('a2'), mk_version('a1', 'v1')], [mk_build('a1'), mk_build('a2', built=False)])
+  write_package(index, 'foo', 'b', [mk_version('b2')], inline_vers=[mk_version('b1')])
+  for include_builds in [False, True]:
+    eager, _ = load_index(index, include_builds)
+    lazy, _ = load_index(index, include_builds, lazy=True)
+    assert all(isinstance(pkg, LazyPackage) and not pkg.loaded for pkg in lazy)
+    assert [dict(pkg) for pkg in lazy] == eager
+  lazy, _ = load_index(index, lazy=True)
+  b = next(pkg for pkg in lazy if pkg['name'] == 'b')
+  assert [ver['revision'] for ver in b['versions']] == ['b1']
+
+def test_write_index_renames_lazy_package(tmp_path):
+  index = str(tmp_path)
+  write_package(index, 'foo', 'a', [mk_version('a1', 'v1')], [mk_build('a1')])
+  pkgs, aliases = load_index(index, lazy=True)
+  pkg = pkgs[0]
+  pkg['owner'] = 'bar'
+  pkg['fullName'] = 'bar/a'
+  write_index(index, [pkg], aliases)
+  assert not os.path.exists(os.path.join(index, index_relpath('foo', 'a'), 'metadata.json'))
+  pkgs, _ = load_index(index, include_builds=True)
+  assert [pkg['fullName'] for pkg in pkgs] == ['bar/a']
+  assert [ver['revision'] for ver in pkgs[0]['versions']] == ['a1']
+  assert [build['revision'] for build in mk_builds(pkgs[0])] == ['a1']
+
+def test_index_snapshot_reparses_only_changed_packages(monkeypatch, tmp_path):
+  index = str(tmp_path / 'index')
+  cache = str(tmp_path / 'index.pickle')
+  write_package(index, 'foo', 'a', [mk_version('a1')], [mk_build('a1')])
+  b_dir = write_package(index, 'foo', 'b', [mk_version('b1')], [mk_build('b1')])
+  loaded = list[str]()
+  load_package = utils.index.load_package
+  def counting_load_package(pkg_dir: str, *args):
+    loaded.append(os.path.basename(pkg_dir))
+    return load_package(pkg_dir, *args)
+  monkeypatch.setattr(utils.index, 'load_package', counting_load_package)
+  cold, _ = load_index(index, include_builds=True, cache=cache)
+  assert sorted(loaded) == ['a', 'b']
+  loaded.clear()
+  warm, _ = load_index(index, include_builds=True, cache=cache)
+  assert loaded == []
+  assert warm == cold
+  # Only the changed package is re-parsed
+  with open(os.path.join(b_dir, 'builds.json'), 'w') as f:
+    json.dump({'schemaVersion': '1.2.0', 'data': [mk_build('b1', built=False, run_at='2024-01-03T00:00:00Z')]}, f)
+  pkgs, _ = load_index(index, include_builds=True, cache=cache)
+  assert loaded == ['b']
+  assert pkgs == load_index(index, include_builds=True)[0]
+
+def test_build_cache_is_shared_by_revision(tmp_path):
+  index = str(tmp_path)
+  v4_9, v4_10 = 'leanprover/lean4:v4.9.0', 'leanprover/lean4:v4.10.0'
+  write_package(index, 'foo', 'a', [mk_version('r1')], [
+    mk_build('r1', v4_9, run_at='2024-01-01T00:00:00Z'),
+    mk_build('r1', v4_9, run_at='2024-01-03T00:00:00Z'),
+    mk_build('r1', v4_10, built=False),
+  ])
+  # A fork at the same revision with an older build
+  write_package(index, 'bar', 'a', [mk_version('r1')], [mk_build('r1', v4_9, run_at='2024-01-02T00:00:00Z')])
+  cache = load_build_cache(index)
+  assert list(cache.keys()) == ['r1']
+  key = build_cache_key('r1', v4_9, [])
+  assert list(cache['r1'].keys()) == [key] # failed builds are not cached
+  assert cache['r1'][key]['runAt'] == '2024-01-03T00:00:00Z'
+  # Keys depend on the manifest's dependencies
+  dep = {'type': 'git', 'name': 'b', 'scope': 'foo', 'rev': 'abc'}
+  assert build_cache_key('r1', v4_9, [dep]) != key
@@ -0,0 +1,75 @@
+import os
+import re
+import sys
+
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SCRIPTS_DIR)
+import utils.repo as repo
+
+# Repositories with a matching file of the given size
+FILES = [(f"R_{i}", f"owner/repo{i}", i * 7 % 1000) for i in range(120)]
+
+class FakeCodeSearch:
+  def __init__(self, fail_after: int = -1):
+    self.num_searches = 0
+    self.fail_after = fail_after
+
+  def __call__(self, endpoint: str, params: dict, *args, **kwargs):
+    assert endpoint == 'search/code'
+    if self.num_searches == self.fail_after:
+      raise RuntimeError("search interrupted")
+    self.num_searches += 1
+    match = re.search(r'size:(\d+)\.\.(\d+)', params['q'])
+    assert match is not None
+    lo, hi = int(match[1]), int(match[2])
+    hits = [(id, name) for id, name, size in FILES if lo <= size <= hi]
+    start = (params['page'] - 1) * params['per_page']
+    items = [{'repository': {'node_id': id, 'full_name': name}} for id, name in hits[start:start+params['per_page']]]
+    return {'total_count': len(hits), 'items': items}
+
+def search(monkeypatch, search: FakeCodeSearch, limit: int, checkpoint: str):
+  monkeypatch.setattr(repo, 'query_github_api', search)
+  monkeypatch.setattr(repo, 'CODE_SEARCH_CAP', 25)
+  monkeypatch.setattr(repo, 'CODE_SEARCH_MAX_SIZE', 1000)
+  return list(repo.search_code_repos('filename:lake-manifest.json', limit, checkpoint))
+
+def test_search_code_repos_shards(monkeypatch, tmp_path):
+  checkpoint = str(tmp_path / 'search.json')
+  results = search(monkeypatch, FakeCodeSearch(), -1, checkpoint)
+  assert sorted(results) == sorted((id, name) for id, name, _ in FILES)
+  assert not os.path.exists(checkpoint)
+
+def test_search_code_repos_limit_does_not_freeze(monkeypatch, tmp_path):
+  checkpoint = str(tmp_path / 'search.json')
+  results = search(monkeypatch, FakeCodeSearch(), 30, checkpoint)
+  assert len(results) == 30
+  assert not os.path.exists(checkpoint)
+  # A rerun searches again instead of replaying the previous results
+  rerun = FakeCodeSearch()
+  assert len(search(monkeypatch, rerun, 30, checkpoint)) == 30
+  assert rerun.num_searches > 0
+
+def test_search_code_repos_resumes(monkeypatch, tmp_path):
+  checkpoint = str(tmp_path / 'search.json')
+  full = FakeCodeSearch()
+  search(monkeypatch, full, -1, checkpoint)
+  interrupted = FakeCodeSearch(fail_after=3)
+  try:
+    search(monkeypatch, interrupted, -1, checkpoint)
+  except RuntimeError:
+    pass
+  assert os.path.exists(checkpoint)
+  resumed = FakeCodeSearch()
+  results = search(monkeypatch, resumed, -1, checkpoint)
+  assert sorted(results) == sorted((id, name) for id, name, _ in FILES)
+  assert interrupted.num_searches + resumed.num_searches == full.num_searches
+  assert not os.path.exists(checkpoint)
+  # A different limit starts over
+  interrupted = FakeCodeSearch(fail_after=3)
+  try:
+    search(monkeypatch, interrupted, -1, checkpoint)
+  except RuntimeError:
+    pass
+  restarted = FakeCodeSearch()
+  search(monkeypatch, restarted, 200, checkpoint)
+  assert restarted.num_searches == full.num_searches
@@ -0,0 +1,71 @@
+import os
+import sys
+import subprocess
+import importlib.util
+
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SCRIPTS_DIR)
+spec = importlib.util.spec_from_file_location('testbed_analyze', os.path.join(SCRIPTS_DIR, 'testbed-analyze.py'))
+assert spec is not None and spec.loader is not None
+analyze = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(analyze)
+
+def git(dir: str, *args: str):
+  subprocess.run(['git', '-c', 'user.name=test', '-c', 'user.email=test@example.com', *args], cwd=dir, check=True, capture_output=True)
+
+def write(dir: str, path: str, content: str):
+  path = os.path.join(dir, path)
+  os.makedirs(os.path.dirname(path), exist_ok=True)
+  with open(path, 'w') as f:
+    f.write(content)
+
+def commit_tag(dir: str, tag: str):
+  git(dir, 'add', '-A')
+  git(dir, 'commit', '-q', '-m', tag)
+  git(dir, 'tag', tag)
+
+def test_batch_tag_metadata_skips_non_blobs(tmp_path):
+  dir = str(tmp_path)
+  git(dir, 'init', '-q')
+  manifest = '{"version": 7, "packagesDir": ".lake/packages", "packages": [], "name": "foo"}'
+  # `LICENSE` is a directory and `lean-toolchain` a symlink
+  write(dir, 'LICENSE/MIT', 'license')
+  write(dir, 'toolchain', 'leanprover/lean4:v4.9.0\n')
+  os.symlink('toolchain', os.path.join(dir, 'lean-toolchain'))
+  write(dir, 'lake-manifest.json', manifest)
+  write(dir, 'README.md', 'readme')
+  commit_tag(dir, 'v1')
+  # A plain tag read after the directory and symlink
+  git(dir, 'rm', '-q', '-r', 'LICENSE', 'lean-toolchain')
+  write(dir, 'LICENSE', 'license')
+  write(dir, 'lean-toolchain', 'leanprover/lean4:v4.10.0\n')
+  commit_tag(dir, 'v2')
+  # A symlink out of the repository
+  os.remove(os.path.join(dir, 'lake-manifest.json'))
+  os.symlink('/nonexistent/lake-manifest.json', os.path.join(dir, 'lake-manifest.json'))
+  commit_tag(dir, 'v3')
+  metas = analyze.batch_tag_metadata(['v1', 'v2', 'v3'], dir)
+  assert metas['v1']['toolchain'] == 'leanprover/lean4:v4.9.0'
+  assert metas['v1']['manifest'].name == 'foo'
+  assert metas['v1']['files'] == {'lean-toolchain', 'lake-manifest.json', 'LICENSE', 'README.md'}
+  assert metas['v2']['toolchain'] == 'leanprover/lean4:v4.10.0'
+  assert metas['v2']['manifest'].name == 'foo'
+  assert metas['v2']['files'] == {'lean-toolchain', 'lake-manifest.json', 'LICENSE', 'README.md'}
+  assert metas['v3']['toolchain'] == 'leanprover/lean4:v4.10.0'
+  assert metas['v3']['manifest'].name is None
+  assert metas['v3']['files'] == {'lean-toolchain', 'LICENSE', 'README.md'}
+
+def test_try_build_marks_cached_builds(tmp_path):
+  ver = {'revision': 'r1', 'toolchain': 'leanprover/lean4:v4.9.0', 'dependencies': [], 'builds': []}
+  build = {
+    'built': True, 'tested': None, 'toolchain': 'leanprover/lean4:v4.10.0', 'requiredUpdate': False,
+    'archiveSize': 10, 'archiveHash': 'abc', 'runAt': '2024-01-01T00:00:00Z', 'url': 'https://example.com/job/1',
+  }
+  cache = {analyze.build_cache_key('r1', 'leanprover/lean4:v4.10.0', []): build}
+  # a cache hit runs no commands (`dir` does not exist)
+  result, failure = analyze.try_build(ver, None, 'leanprover/lean4:v4.10.0', False, cache, str(tmp_path / 'missing'))
+  assert result == {**build, 'cached': True}
+  assert failure is False
+  assert 'cached' not in build
+  # a different manifest is a cache miss
+  assert analyze.cached_build({**ver, 'dependencies': [{'name': 'foo'}]}, 'leanprover/lean4:v4.10.0', cache) is None
@@ -0,0 +1,50 @@
+import os
+import sys
+import importlib.util
+
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SCRIPTS_DIR)
+spec = importlib.util.spec_from_file_location('testbed_create', os.path.join(SCRIPTS_DIR, 'testbed-create.py'))
+assert spec is not None and spec.loader is not None
+create = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(create)
+
+V4_9, V4_10 = 'leanprover/lean4:v4.9.0', 'leanprover/lean4:v4.10.0'
+
+def mk_version(rev: str, tag: str | None) -> dict:
+  return {'revision': rev, 'tag': tag, 'toolchain': V4_9, 'dependencies': []}
+
+def mk_build(rev: str, toolchain: str) -> dict:
+  return {
+    'built': True, 'tested': None, 'toolchain': toolchain, 'requiredUpdate': False,
+    'archiveSize': None, 'archiveHash': None, 'runAt': '2024-01-01T00:00:00Z', 'url': None,
+  }
+
+def mk_cache(*builds: tuple[str, str]) -> dict:
+  cache = dict[str, dict]()
+  for rev, toolchain in builds:
+    cache.setdefault(rev, {})[create.build_cache_key(rev, toolchain, [])] = mk_build(rev, toolchain)
+  return cache
+
+def test_cached_builds_of_built_versions():
+  vers = [mk_version('r2', None), mk_version('r1', 'v1')]
+  cache = mk_cache(('r2', V4_9), ('r2', V4_10), ('r1', V4_9))
+  # Only HEAD is built without version tags
+  assert len(create.cached_builds(cache, vers, V4_9, '')) == 1
+  assert len(create.cached_builds(cache, vers, f"{V4_9},{V4_10}", '')) == 2
+  assert len(create.cached_builds(cache, vers, 'package', 'v.*')) == 1
+  assert create.cached_builds(cache, vers, '', '') == {}
+
+def test_builds_cached_requires_every_target():
+  vers = [mk_version('r2', None), mk_version('r1', 'v1')]
+  cache = mk_cache(('r2', V4_9), ('r2', V4_10), ('r1', V4_9))
+  def covered(toolchains: str, version_tags: str) -> bool:
+    builds = create.cached_builds(cache, vers, toolchains, version_tags)
+    return create.builds_cached(builds, create.build_versions(vers, version_tags), toolchains)
+  assert covered(V4_9, '')
+  assert covered(f"{V4_9},{V4_10}", '')
+  assert covered('package', '')
+  assert covered(V4_9, '.*')
+  assert not covered(V4_10, 'v.*')
+  assert not covered(V4_9, 'nomatch') # nothing to build, but still analyzed
+  assert not covered('', '') # index-only
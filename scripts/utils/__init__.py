@@ -1,5 +1,8 @@
 from utils.manifest import *
+from utils.refdata import *
 from utils.index import *
 from utils.toolchain import *
 from utils.repo import *
 from utils.upload import *
+from utils.graph import *
+from utils.table import *
@@ -1,3 +1,4 @@
+import os
 import logging
 import subprocess
 import itertools
@@ -62,6 +63,18 @@ def filehash(path: str) -> str:
             h.update(mv[:n])
     return h.hexdigest()
 
+def write_if_changed(path: str, content: str) -> bool:
+  """Write `content` to `path` unless the file already contains exactly it. Returns whether it wrote."""
+  try:
+    with open(path, 'r') as f:
+      if f.read() == content:
+        return False
+  except FileNotFoundError:
+    pass
+  with open(path, 'w') as f:
+    f.write(content)
+  return True
+
 #---
 # Time
 #---
@@ -88,25 +101,25 @@ def fmt_timestamp(timestamp: int):
 class CommandError(RuntimeError):
   pass
 
-def run_cmd(*args: str, allow_failure: bool =False):
+def run_cmd(*args: str, allow_failure: bool =False, cwd: str | None = None, env: Mapping[str, str] | None = None):
   logging.debug(f'> {" ".join(args)}')
-  rc = subprocess.run(args).returncode
+  rc = subprocess.run(args, cwd=cwd, env=None if env is None else {**os.environ, **env}).returncode
   if not allow_failure and rc != 0:
     raise CommandError(f'external command exited with code {rc}')
   return rc
 
 @overload
-def capture_cmd(*args: str) -> bytes: ...
+def capture_cmd(*args: str, cwd: str | None = None, input: bytes | None = None) -> bytes: ...
 
 @overload
-def capture_cmd(*args: str, allow_failure: Literal[False]) -> bytes: ...
+def capture_cmd(*args: str, allow_failure: Literal[False], cwd: str | None = None, input: bytes | None = None) -> bytes: ...
 
 @overload
-def capture_cmd(*args: str, allow_failure: bool) -> bytes | None: ...
+def capture_cmd(*args: str, allow_failure: bool, cwd: str | None = None, input: bytes | None = None) -> bytes | None: ...
 
-def capture_cmd(*args: str, allow_failure: bool = False):
+def capture_cmd(*args: str, allow_failure: bool = False, cwd: str | None = None, input: bytes | None = None):
   logging.debug(f'> {" ".join(args)}')
-  child = subprocess.run(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+  child = subprocess.run(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=cwd, input=input)
   if child.returncode != 0:
     if allow_failure:
       return None
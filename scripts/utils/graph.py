@@ -0,0 +1,91 @@
+from typing import Iterator, Sequence, Collection
+
+# Graphs are adjacency lists over nodes `0..n-1`.
+# Sets of nodes are represented as bitsets (Python `int`s) for fast unions.
+
+def strongly_connected_components(edges: Sequence[Collection[int]]) -> list[list[int]]:
+  """
+  Compute the strongly connected components of the graph with Tarjan's algorithm.
+  Components are returned in reverse topological order (i.e., a component comes
+  before any component with an edge to it).
+  """
+  num_nodes = len(edges)
+  index = [-1] * num_nodes
+  low = [0] * num_nodes
+  on_stack = [False] * num_nodes
+  stack = list[int]()
+  components = list[list[int]]()
+  counter = 0
+  for root in range(num_nodes):
+    if index[root] != -1:
+      continue
+    index[root] = low[root] = counter
+    counter += 1
+    stack.append(root)
+    on_stack[root] = True
+    work = [(root, iter(edges[root]))]
+    while len(work) > 0:
+      node, succs = work[-1]
+      for succ in succs:
+        if index[succ] == -1:
+          index[succ] = low[succ] = counter
+          counter += 1
+          stack.append(succ)
+          on_stack[succ] = True
+          work.append((succ, iter(edges[succ])))
+          break
+        elif on_stack[succ]:
+          low[node] = min(low[node], index[succ])
+      else:
+        work.pop()
+        if len(work) > 0:
+          parent = work[-1][0]
+          low[parent] = min(low[parent], low[node])
+        if low[node] == index[node]:
+          component = list[int]()
+          while True:
+            member = stack.pop()
+            on_stack[member] = False
+            component.append(member)
+            if member == node: break
+          components.append(component)
+  return components
+
+def transitive_predecessors(edges: Sequence[Collection[int]]) -> list[int]:
+  """
+  Compute, for each node, the bitset of the other nodes which can reach it.
+  The graph is condensed into its strongly connected components first,
+  so each component's predecessors are only computed once.
+  """
+  components = strongly_connected_components(edges)
+  component_of = [0] * len(edges)
+  component_bits = list[int]()
+  for idx, component in enumerate(components):
+    bits = 0
+    for node in component:
+      component_of[node] = idx
+      bits |= 1 << node
+    component_bits.append(bits)
+  preds = [set[int]() for _ in components]
+  for node, succs in enumerate(edges):
+    for succ in succs:
+      if component_of[node] != component_of[succ]:
+        preds[component_of[succ]].add(component_of[node])
+  # Predecessor components come later in reverse topological order
+  reach = [0] * len(components)
+  for idx in reversed(range(len(components))):
+    bits = 0
+    for pred in preds[idx]:
+      bits |= component_bits[pred] | reach[pred]
+    reach[idx] = bits
+  return [
+    reach[component_of[node]] | (component_bits[component_of[node]] & ~(1 << node))
+    for node in range(len(edges))
+  ]
+
+def bitset_members(bits: int) -> Iterator[int]:
+  """Yield the nodes in a bitset in ascending order."""
+  while bits != 0:
+    low = bits & -bits
+    yield low.bit_length() - 1
+    bits ^= low
@@ -1,9 +1,12 @@
 import os
 import json
 import shutil
+import pickle
+import hashlib
 import logging
-from typing import Callable, Mapping, MutableMapping, Iterable, TypedDict
-from requests.structures import CaseInsensitiveDict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import Callable, Collection, Iterator, Mapping, MutableMapping, Iterable, TypedDict
 from utils.core import *
 from utils.package import *
 
@@ -13,31 +16,112 @@ class AliasStub(TypedDict):
   alias: Alias
 
 def flatten_mapping(mapping: MutableMapping[T, T]):
-  def follow(parents: list[T], target: T):
-    if target in mapping:
-      if target in parents:
-        parents.append(target)
-        raise RuntimeError(f"Cycle: {parents}")
-      parents.append(target)
-      follow(parents, mapping[target])
-    else:
-      for parent in parents:
-        mapping[parent] = target
-  parents = list[T]()
-  for root, target in mapping.items():
-    parents.append(root)
-    follow(parents, target)
-    parents.clear()
-
-def resolve_aliases(pkgs: Iterable[Package], aliases: Mapping[str, str]):
-  resolved = CaseInsensitiveDict[Package]()
-  for alias, target in aliases.items():
-    pkg = next((pkg for pkg in pkgs if pkg['fullName'].lower() == target.lower()), None)
-    if pkg is not None:
-      resolved[alias] = pkg
-    else:
-      logging.warning(f"Failed to resolve alias '{alias}' -> '{target}'")
-  return resolved
+  """
+  Map every key directly to the end of its chain of mappings (in place).
+  Chains are compressed iteratively, so each key is only followed once.
+  Raises a `RuntimeError` if a chain is a cycle.
+  """
+  flattened = set[T]()
+  for root in list(mapping.keys()):
+    if root in flattened:
+      continue
+    path = [root]
+    on_path = {root}
+    target = mapping[root]
+    while target in mapping:
+      if target in flattened:
+        target = mapping[target]
+        break
+      if target in on_path:
+        path.append(target)
+        raise RuntimeError(f"Cycle: {path[path.index(target):]}")
+      path.append(target)
+      on_path.add(target)
+      target = mapping[target]
+    for key in path:
+      mapping[key] = target
+      flattened.add(key)
+
+class AliasIndex(MutableMapping[str, Package]):
+  """
+  Package aliases resolved to their target packages.
+  Aliases and package names are matched case-insensitively, but
+  the casing an alias was last set with is retained.
+  """
+  packages: dict[str, Package]
+  aliases: dict[str, tuple[str, Package]]
+  referrers: dict[int, set[str]]
+
+  def __init__(self, pkgs: Iterable[Package] = [], aliases: Mapping[str, str] = {}) -> None:
+    self.packages = {}
+    self.aliases = {}
+    self.referrers = {}
+    for pkg in pkgs:
+      self.packages.setdefault(pkg['fullName'].casefold(), pkg)
+    self.add_aliases(aliases)
+
+  def add_package(self, pkg: Package):
+    self.packages[pkg['fullName'].casefold()] = pkg
+
+  def find(self, name: str) -> Package | None:
+    """Return the package named `name` or, if it is an alias, its target."""
+    key = name.casefold()
+    pkg = self.packages.get(key, None)
+    if pkg is None:
+      entry = self.aliases.get(key, None)
+      if entry is not None:
+        pkg = entry[1]
+    return pkg
+
+  def add_aliases(self, aliases: Mapping[str, str]):
+    """Add aliases of package names (which may be chains of aliases)."""
+    names = dict[str, str]()
+    targets = dict[str, str]()
+    for alias, target in aliases.items():
+      key = alias.casefold()
+      names[key] = alias
+      targets[key] = target.casefold()
+    flatten_mapping(targets)
+    for key, target in targets.items():
+      pkg = self.find(target)
+      if pkg is not None:
+        self[names[key]] = pkg
+      else:
+        alias = names[key]
+        logging.warning(f"Failed to resolve alias '{alias}' -> '{aliases[alias]}'")
+
+  def __getitem__(self, alias: str) -> Package:
+    return self.aliases[alias.casefold()][1]
+
+  def __setitem__(self, alias: str, pkg: Package):
+    key = alias.casefold()
+    if key in self.aliases:
+      del self[alias]
+    self.aliases[key] = (alias, pkg)
+    self.referrers.setdefault(id(pkg), set()).add(key)
+    # A package that is now an alias (e.g., by rename or merge) redirects
+    # aliases which targeted it to the new package
+    old_pkg = self.packages.pop(key, None)
+    if old_pkg is not None and old_pkg is not pkg:
+      for old_key in self.referrers.pop(id(old_pkg), set()):
+        name, _ = self.aliases[old_key]
+        self.aliases[old_key] = (name, pkg)
+        self.referrers[id(pkg)].add(old_key)
+    self.add_package(pkg)
+
+  def __delitem__(self, alias: str):
+    key = alias.casefold()
+    _, pkg = self.aliases.pop(key)
+    keys = self.referrers[id(pkg)]
+    keys.discard(key)
+    if len(keys) == 0:
+      del self.referrers[id(pkg)]
+
+  def __iter__(self) -> Iterator[str]:
+    return (name for name, _ in self.aliases.values())
+
+  def __len__(self) -> int:
+    return len(self.aliases)
 
 # Alias encoding for the Reservoir `manifest.json`
 def serialize_aliases(aliases: Mapping[str, Package]) -> dict[str, str]:
@@ -52,13 +136,20 @@ def alias_relpath(alias: str) -> str:
 def package_relpath(pkg: Package) -> str:
   return index_relpath(pkg['owner'], pkg['name'])
 
-def walk_index(path: str):
-  for owner_dir in os.listdir(path):
-    if (owner_dir.startswith('.')):
-      continue
-    owner_path = os.path.join(path, owner_dir)
-    for pkg_dir in os.listdir(owner_path):
-      yield os.path.join(owner_dir, pkg_dir)
+def scan_index(path: str) -> Iterator[tuple[str, bool]]:
+  """
+  Yield the relative path of each index entry in a stable (sorted) order
+  along with whether it is a package directory (as opposed to a stub).
+  Uses `os.scandir` so that the entry type comes from the directory listing
+  rather than an extra `stat` call per entry.
+  """
+  with os.scandir(path) as it:
+    owner_entries = sorted((e for e in it if not e.name.startswith('.') and e.is_dir()), key=lambda e: e.name)
+  for owner_entry in owner_entries:
+    with os.scandir(owner_entry.path) as it:
+      pkg_entries = sorted(it, key=lambda e: e.name)
+    for pkg_entry in pkg_entries:
+      yield os.path.join(owner_entry.name, pkg_entry.name), pkg_entry.is_dir()
 
 class BuildV0Base(TypedDict):
   url: str | None
@@ -94,6 +185,16 @@ def load_versions(path: str) -> list[PackageVersionMetadata]:
   else:
     return data
 
+def load_known_data(path: str) -> TestbedKnownData:
+  """Load a file written by `testbed-create --known-dir` (or a plain `versions.json`)."""
+  if not os.path.exists(path):
+    return {'versions': [], 'builds': {}}
+  with open(path, 'r') as f:
+    data: Any = json.load(f)
+  if isinstance(data, dict) and 'versions' in data:
+    return {'versions': data['versions'], 'builds': data.get('builds', {})}
+  return {'versions': load_versions(path), 'builds': {}}
+
 def load_builds(path: str) -> list[Build]:
   if not os.path.exists(path):
     return []
@@ -124,55 +225,310 @@ def load_package(pkg_dir: str, relpath: str, include_versions: bool = True, incl
   if not include_builds:
     return pkg
   # Load builds
-  builds = load_builds(os.path.join(pkg_dir, 'builds.json'))
-  ver_dict = dict((v['revision'], v) for v in pkg['versions'])
-  for build in builds:
-    ver = ver_dict.get(build['revision'], None)
-    if ver is None:
-      pkg['builds'].append(build)
-    else:
-      ver['builds'].append(build_result(build))
+  add_builds(pkg, load_builds(os.path.join(pkg_dir, 'builds.json')))
   return pkg
 
-def load_index_metadata(path: str) -> list[PackageMetadata]:
+LAZY_PACKAGE_KEYS = ('versions', 'builds')
+
+class LazyPackage(dict):
+  """
+  A `Package` whose `versions` and `builds` are only read from the index
+  the first time either is accessed. Otherwise, it behaves like a plain `dict`.
+  """
+  pkg_dir: str
+  include_builds: bool
+
+  def __init__(self, pkg: PackageMetadata, pkg_dir: str, include_builds: bool = False) -> None:
+    super().__init__((k, v) for k, v in pkg.items() if k not in LAZY_PACKAGE_KEYS)
+    self.pkg_dir = pkg_dir
+    self.include_builds = include_builds
+
+  @property
+  def loaded(self) -> bool:
+    return all(dict.__contains__(self, k) for k in LAZY_PACKAGE_KEYS)
+
+  def load(self):
+    """Load any lazy fields that have not yet been loaded (or assigned)."""
+    if self.loaded:
+      return
+    if not dict.__contains__(self, 'versions'):
+      # as in `load_package`, inline versions take priority
+      with open(os.path.join(self.pkg_dir, 'metadata.json'), 'r') as f:
+        vers: list[PackageVersionMetadata] | None = json.load(f).get('versions', None)
+      if vers is None:
+        vers = load_versions(os.path.join(self.pkg_dir, 'versions.json'))
+      dict.__setitem__(self, 'versions', list(map(version_of_metadata, vers)))
+    if not dict.__contains__(self, 'builds'):
+      dict.__setitem__(self, 'builds', [])
+      if self.include_builds:
+        add_builds(cast(Package, self), load_builds(os.path.join(self.pkg_dir, 'builds.json')))
+
+  def unload(self):
+    """Drop loaded lazy fields so that they can be garbage collected (and reloaded on demand)."""
+    for k in LAZY_PACKAGE_KEYS:
+      dict.pop(self, k, None)
+
+  def __missing__(self, key):
+    if key in LAZY_PACKAGE_KEYS:
+      self.load()
+      return dict.__getitem__(self, key)
+    raise KeyError(key)
+
+  def __contains__(self, key):
+    return key in LAZY_PACKAGE_KEYS or dict.__contains__(self, key)
+
+  def get(self, key, default=None):
+    return self[key] if key in self else default
+
+  def pop(self, key, *args):
+    if key in LAZY_PACKAGE_KEYS: self.load()
+    return dict.pop(self, key, *args)
+
+  def setdefault(self, key, default=None):
+    if key in LAZY_PACKAGE_KEYS: self.load()
+    return dict.setdefault(self, key, default)
+
+  # Operations over the whole package force it to load
+
+  def __iter__(self):
+    self.load()
+    return dict.__iter__(self)
+
+  def __len__(self):
+    self.load()
+    return dict.__len__(self)
+
+  def __eq__(self, other):
+    self.load()
+    return dict.__eq__(self, other)
+
+  def __ne__(self, other):
+    self.load()
+    return dict.__ne__(self, other)
+
+  def __repr__(self):
+    self.load()
+    return dict.__repr__(self)
+
+  def keys(self):
+    self.load()
+    return dict.keys(self)
+
+  def values(self):
+    self.load()
+    return dict.values(self)
+
+  def items(self):
+    self.load()
+    return dict.items(self)
+
+  def copy(self):
+    self.load()
+    return dict(dict.items(self))
+
+  def __reduce__(self):
+    # pickle unloaded packages as such
+    return (LazyPackage, (dict(dict.items(self)), self.pkg_dir, self.include_builds))
+
+def lazy_package(pkg: PackageMetadata, pkg_dir: str, include_builds: bool = False) -> Package:
+  return cast(Package, LazyPackage(pkg, pkg_dir, include_builds))
+
+#---
+# Index snapshots
+#---
+
+INDEX_SNAPSHOT_VERSION = 1
+PACKAGE_FILES = ('metadata.json', 'versions.json', 'builds.json')
+
+FileStamp = tuple[int, int] | None
+PackageStamp = tuple[FileStamp, ...]
+
+def file_stamp(path: str) -> FileStamp:
+  """Return the modification time (in ns) and size of a file (or `None` if it does not exist)."""
+  try:
+    st = os.stat(path)
+  except FileNotFoundError:
+    return None
+  return st.st_mtime_ns, st.st_size
+
+def package_stamp(pkg_dir: str) -> PackageStamp:
+  return tuple(file_stamp(os.path.join(pkg_dir, file)) for file in PACKAGE_FILES)
+
+class IndexSnapshot:
+  """
+  A persistent on-disk cache of parsed index entries.
+  Each entry is keyed by its relative path and is only reused if the
+  stamps of its index files are unchanged since it was cached.
+  """
+  path: str
+  packages: dict[tuple[bool, bool], dict[str, tuple[PackageStamp, Package]]]
+  aliases: dict[str, tuple[FileStamp, Alias | None]]
+  modified: bool
+
+  def __init__(self, path: str) -> None:
+    self.path = path
+    self.packages = {}
+    self.aliases = {}
+    self.modified = False
+    try:
+      with open(path, 'rb') as f:
+        data = pickle.load(f)
+    except FileNotFoundError:
+      return
+    except Exception as e:
+      logging.warning(f"Ignoring unreadable index snapshot '{path}': {e}")
+      return
+    if not isinstance(data, dict) or data.get('version', None) != INDEX_SNAPSHOT_VERSION:
+      logging.info(f"Ignoring outdated index snapshot '{path}'")
+      return
+    self.packages = data['packages']
+    self.aliases = data['aliases']
+
+  def save(self):
+    if not self.modified:
+      return
+    logging.debug(f"Saving index snapshot to '{self.path}'")
+    data = {'version': INDEX_SNAPSHOT_VERSION, 'packages': self.packages, 'aliases': self.aliases}
+    tmp_path = f"{self.path}.tmp"
+    with open(tmp_path, 'wb') as f:
+      pickle.dump(data, f, pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, self.path)
+    self.modified = False
+
+  def load_packages(
+      self, path: str, relpaths: Collection[str],
+      include_versions: bool = True, include_builds: bool = False,
+      workers: int | None = 1
+    ) -> list[Package]:
+    """Like `load_packages`, but only re-parses packages whose index files have changed."""
+    level = (include_versions or include_builds, include_builds)
+    old_entries = self.packages.get(level, {})
+    entries = dict[str, tuple[PackageStamp, Package]]()
+    stale = list[str]()
+    stamps = dict[str, PackageStamp]()
+    for relpath in relpaths:
+      stamp = package_stamp(os.path.join(path, relpath))
+      entry = old_entries.get(relpath, None)
+      if entry is not None and entry[0] == stamp:
+        entries[relpath] = entry
+      else:
+        stamps[relpath] = stamp
+        stale.append(relpath)
+    logging.debug(f"Index snapshot: {len(entries)} cached packages, {len(stale)} stale")
+    for relpath, pkg in zip(stale, load_packages(path, stale, include_versions, include_builds, workers)):
+      entries[relpath] = (stamps[relpath], pkg)
+    if len(stale) > 0 or len(entries) != len(old_entries):
+      self.modified = True
+    self.packages[level] = entries
+    return [entries[relpath][1] for relpath in relpaths]
+
+  def load_alias_stubs(self, path: str, relpaths: Iterable[str]) -> Iterable[Alias | None]:
+    """Like `load_alias_stub` for each of `relpaths`, but reusing unchanged cached stubs."""
+    entries = dict[str, tuple[FileStamp, Alias | None]]()
+    for relpath in relpaths:
+      stub_path = os.path.join(path, relpath)
+      stamp = file_stamp(stub_path)
+      entry = self.aliases.get(relpath, None)
+      if entry is None or entry[0] != stamp:
+        entry = (stamp, load_alias_stub(stub_path, relpath))
+        self.modified = True
+      entries[relpath] = entry
+      yield entry[1]
+    if len(entries) != len(self.aliases):
+      self.modified = True
+    self.aliases = entries
+
+#---
+# Loading
+#---
+
+def load_packages(
+    path: str, relpaths: Collection[str],
+    include_versions: bool = True, include_builds: bool = False,
+    workers: int | None = 1
+  ) -> list[Package]:
+  """
+  Load the packages at `relpaths` within the index at `path`, in order.
+  If `workers` is not 1, packages are loaded concurrently by a process pool
+  (`None` uses one process per CPU).
+  """
+  pkg_dirs = [os.path.join(path, relpath) for relpath in relpaths]
+  if workers is None:
+    workers = os.cpu_count() or 1
+  if workers <= 1 or len(pkg_dirs) <= 1:
+    return [load_package(pkg_dir, relpath, include_versions, include_builds)
+      for pkg_dir, relpath in zip(pkg_dirs, relpaths)]
+  with ProcessPoolExecutor(workers) as executor:
+    chunksize = max(1, len(pkg_dirs) // (4 * workers))
+    return list(executor.map(load_package,
+      pkg_dirs, relpaths, repeat(include_versions), repeat(include_builds),
+      chunksize=chunksize))
+
+def load_alias_stub(stub_path: str, relpath: str) -> Alias | None:
+  with open(stub_path, 'r') as f:
+    content = f.read().strip()
+  try:
+    obj = json.loads(content)
+    return obj.get('alias', None)
+  except json.JSONDecodeError:
+    logging.error(f"{relpath}: Package stub has invalid JSON")
+    return None
+
+def load_index_metadata(path: str, workers: int | None = 1, cache: str | None = None) -> list[PackageMetadata]:
   if os.path.isdir(path):
-    pkgs = list[Package]()
-    for relpath in walk_index(path):
-      pkg_path = os.path.join(path, relpath)
-      if os.path.isdir(pkg_path):
-        pkgs.append(load_package(pkg_path, relpath, False, False))
+    relpaths = [relpath for relpath, is_dir in scan_index(path) if is_dir]
+    if cache is None:
+      pkgs = load_packages(path, relpaths, False, False, workers)
+    else:
+      snapshot = IndexSnapshot(cache)
+      pkgs = snapshot.load_packages(path, relpaths, False, False, workers)
+      snapshot.save()
     return sorted(pkgs, key=lambda pkg: pkg['stars'], reverse=True)
   else:
     with open(path, 'r') as f:
       pkgs: list[Package] = json.load(f)
     return list(map(package_metadata, pkgs))
 
-def load_index(path: str, include_builds=False) -> tuple[list[Package], CaseInsensitiveDict[Package]]:
+def load_index(
+    path: str, include_builds=False,
+    workers: int | None = 1, cache: str | None = None, lazy: bool = False
+  ) -> tuple[list[Package], AliasIndex]:
+  """
+  Load the packages and aliases of the index at `path`.
+  If `cache` is set, it is used as the path of an `IndexSnapshot`
+  which is consulted to avoid re-parsing unchanged packages.
+  If `lazy` is set, only package metadata is loaded up front and
+  the packages are `LazyPackage`s which load the rest on demand.
+  """
   if os.path.isdir(path):
-    pkgs = list[Package]()
-    aliases = CaseInsensitiveDict[str]()
-    for relpath in walk_index(path):
-      pkg_path = os.path.join(path, relpath)
-      if os.path.isdir(pkg_path):
-        pkgs.append(load_package(pkg_path, relpath, True, include_builds))
+    relpaths = list[str]()
+    stub_relpaths = list[str]()
+    for relpath, is_dir in scan_index(path):
+      if is_dir:
+        relpaths.append(relpath)
       else:
-        with open(pkg_path, 'r') as f:
-          content = f.read().strip()
-        try:
-          obj = json.loads(content)
-          alias: Alias = obj.get('alias', None)
-          if alias is not None:
-            aliases[alias['from']] = alias['to']
-        except json.JSONDecodeError:
-          logging.error(f"{relpath}: Package stub has invalid JSON")
+        stub_relpaths.append(relpath)
+    eager = not lazy
+    if cache is None:
+      stubs = (load_alias_stub(os.path.join(path, relpath), relpath) for relpath in stub_relpaths)
+      pkgs = load_packages(path, relpaths, eager, include_builds and eager, workers)
+    else:
+      snapshot = IndexSnapshot(cache)
+      stubs = list(snapshot.load_alias_stubs(path, stub_relpaths))
+      pkgs = snapshot.load_packages(path, relpaths, eager, include_builds and eager, workers)
+      snapshot.save() # before any package is mutated by the caller
+    if lazy:
+      pkgs = [lazy_package(pkg, os.path.join(path, relpath), include_builds) for pkg, relpath in zip(pkgs, relpaths)]
+    aliases = dict[str, str]()
+    for alias in stubs:
+      if alias is not None:
+        aliases[alias['from']] = alias['to']
     pkgs = sorted(pkgs, key=lambda pkg: pkg['stars'], reverse=True)
-    flatten_mapping(aliases)
-    aliases = resolve_aliases(pkgs, aliases)
-    return pkgs, aliases
+    return pkgs, AliasIndex(pkgs, aliases)
   else:
     with open(path, 'r') as f:
       pkgs: list[Package] = json.load(f)
-    return pkgs, CaseInsensitiveDict[Package]()
+    return pkgs, AliasIndex()
 
 BT = TypeVar('BT', bound=BuildResult)
 
@@ -201,7 +557,9 @@ def add_builds(pkg: Package, old_builds: Iterable[Build]):
     if ver is None:
       pkg['builds'].append(old_build)
     else:
-      ver['builds'].append(build_result(old_build))
+      result = build_result(old_build)
+      if result not in ver['builds']: # e.g., reused from the build cache
+        ver['builds'].append(result)
 
 def mk_builds(pkg: Package) -> Iterable[Build]:
   for ver in pkg['versions']:
@@ -210,10 +568,60 @@ def mk_builds(pkg: Package) -> Iterable[Build]:
   for build in trim_builds(pkg['builds'], lambda b: (b['revision'], b['toolchain'])):
     yield build
 
-def write_index(index_dir: str, pkgs: Iterable[Package], aliases: MutableMapping[str, Package]):
+#---
+# Build cache
+#---
+
+# Builds are content-addressed by the revision built, the toolchain built on,
+# and the dependencies of the revision's Lake manifest. Thus, a build recorded
+# for one package can be reused by any other (e.g., a fork) at the same revision.
+
+BuildCache = dict[str, BuildResult]
+
+def manifest_hash(deps: list[Dependency]) -> str:
+  return hashlib.sha256(json.dumps(deps, sort_keys=True).encode()).hexdigest()
+
+def build_cache_key(revision: str, toolchain: str, deps: list[Dependency]) -> str:
+  return f"{revision}:{toolchain}:{manifest_hash(deps)}"
+
+def load_build_cache(path: str) -> dict[str, BuildCache]:
+  """
+  Collect the successful builds of the index at `path` by revision
+  and then by `build_cache_key`. The latest build of a key is kept.
+  """
+  cache = dict[str, BuildCache]()
+  num_builds = 0
+  for relpath, is_dir in scan_index(path):
+    if not is_dir:
+      continue
+    pkg_dir = os.path.join(path, relpath)
+    vers = {ver['revision']: ver for ver in load_versions(os.path.join(pkg_dir, 'versions.json'))}
+    for build in load_builds(os.path.join(pkg_dir, 'builds.json')):
+      ver = vers.get(build['revision'], None)
+      if ver is None or build['built'] is not True:
+        continue
+      key = build_cache_key(build['revision'], build['toolchain'], ver['dependencies'])
+      builds = cache.setdefault(build['revision'], {})
+      prev_build = builds.get(key, None)
+      if prev_build is None or prev_build['runAt'] < build['runAt']:
+        builds[key] = build_result(build)
+        num_builds += prev_build is None
+  logging.info(f"Build cache: {num_builds} builds of {len(cache)} revisions")
+  return cache
+
+def write_index(index_dir: str, pkgs: Iterable[Package], aliases: MutableMapping[str, Package]) -> int:
+  """
+  Write `pkgs` and `aliases` to the index at `index_dir`.
+  Files whose content would not change are left untouched.
+  Returns the number of files actually written.
+  """
+  num_written = 0
   # Write packages
   for pkg in pkgs:
     logging.debug(f"Writing {pkg['fullName']}")
+    # Load lazy fields before their files are moved or rewritten
+    if isinstance(pkg, LazyPackage):
+      pkg.load()
     # Prepare path
     relpath = package_relpath(pkg)
     pkg_dir = os.path.join(index_dir, relpath)
@@ -241,11 +649,9 @@ def write_index(index_dir: str, pkgs: Iterable[Package], aliases: MutableMapping
     # Ensure package directory exists
     os.makedirs(pkg_dir, exist_ok=True)
     # Write package metadata
-    with open(os.path.join(pkg_dir, "metadata.json"), 'w') as f:
-      data = cast(Any, package_metadata(pkg))
-      data['schemaVersion'] = INDEX_SCHEMA_VERSION_STR
-      json.dump(data, f, indent=2)
-      f.write("\n")
+    data = cast(Any, package_metadata(pkg))
+    data['schemaVersion'] = INDEX_SCHEMA_VERSION_STR
+    num_written += write_if_changed(os.path.join(pkg_dir, "metadata.json"), json.dumps(data, indent=2) + "\n")
     # Compute source-based aliases
     for src in pkg['sources']:
       alias = src.get('fullName', None)
@@ -257,9 +663,8 @@ def write_index(index_dir: str, pkgs: Iterable[Package], aliases: MutableMapping
     # Write versions
     vers = list(map(version_metadata, pkg['versions']))
     if len(vers) > 0:
-      with open(os.path.join(pkg_dir, 'versions.json'), 'w') as f:
-        json.dump({'schemaVersion': INDEX_SCHEMA_VERSION_STR, 'data': vers}, f, indent=2)
-        f.write('\n')
+      data = {'schemaVersion': INDEX_SCHEMA_VERSION_STR, 'data': vers}
+      num_written += write_if_changed(os.path.join(pkg_dir, 'versions.json'), json.dumps(data, indent=2) + '\n')
     # Write builds
     trim_version_builds(pkg)
     builds_file = os.path.join(pkg_dir, 'builds.json')
@@ -269,9 +674,8 @@ def write_index(index_dir: str, pkgs: Iterable[Package], aliases: MutableMapping
     builds = mk_builds(pkg)
     builds = sorted(builds, key=lambda b: b['runAt'], reverse=True)
     if len(builds) > 0:
-      with open(builds_file, 'w') as f:
-        json.dump({'schemaVersion': INDEX_SCHEMA_VERSION_STR, 'data': builds}, f, indent=2)
-        f.write('\n')
+      data = {'schemaVersion': INDEX_SCHEMA_VERSION_STR, 'data': builds}
+      num_written += write_if_changed(builds_file, json.dumps(data, indent=2) + '\n')
     elif builds_exists:
       os.remove(builds_file)
   # Write aliases
@@ -282,7 +686,7 @@ def write_index(index_dir: str, pkgs: Iterable[Package], aliases: MutableMapping
       logging.warning(f"Package located at '{alias}': could not write alias '{alias}' -> '{target}'")
     else:
       os.makedirs(os.path.dirname(alias_path), exist_ok=True)
-      with open(alias_path, 'w') as f:
-        obj: AliasStub = {"alias": {"from": alias, "to": target}}
-        f.write(json.dumps(obj))
-        f.write("\n")
+      obj: AliasStub = {"alias": {"from": alias, "to": target}}
+      num_written += write_if_changed(alias_path, json.dumps(obj) + "\n")
+  logging.info(f"Wrote {num_written} changed index files")
+  return num_written
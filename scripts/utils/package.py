@@ -74,6 +74,11 @@ class TestbedEntry(TypedDict):
   indexName: str | None
   registrationKey: str | None
 
+class TestbedKnownData(TypedDict):
+  """Indexed data on a testbed entry's package, shipped beside the matrix to keep it small."""
+  versions: list[PackageVersionMetadata]
+  builds: dict[str, BuildResult]
+
 class TestbedLayer(TypedDict):
   name: str
   data: list[TestbedEntry]
@@ -122,6 +127,20 @@ class SerialPackage(PackageMetadata):
   versions: list[PackageVersionMetadata]
   builds: list[Build]
 
+class PackageSummary(TypedDict):
+  name: str
+  owner: str
+  fullName: str
+  description: str | None
+  keywords: list[str] | None
+  license: str | None
+  updatedAt: str
+  stars: int
+  latestBuild: Build | None
+  numDependents: int
+  numTransitiveDependents: int
+  shard: str
+
 #---
 # Utils
 #---
@@ -200,7 +219,5 @@ def github_src(pkg: PackageMetadata) -> GitHubSrc | None:
   return None
 
 def github_repo_id(pkg: PackageMetadata) -> str | None:
-  for src in pkg['sources']:
-    if src.get('host', None) == 'github':
-      return cast(GitHubSrc, src)['id']
-  return None
+  src = github_src(pkg)
+  return None if src is None else src['id']
@@ -0,0 +1,133 @@
+import os
+import json
+import time
+import logging
+import threading
+from typing import TypedDict, Callable, Any
+from utils.core import *
+
+#---
+# Reference data
+#---
+
+# Slowly changing reference data fetched from the network (e.g., SPDX
+# licenses and Lean releases) is cached on disk and refreshed once stale.
+# In offline mode (`RESERVOIR_OFFLINE`), only the snapshot in `scripts/refdata`
+# is used. The snapshot is not committed; generate it while online with
+# `scripts/refdata-snapshot.py` before running offline.
+
+REFDATA_SNAPSHOT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'refdata')
+REFDATA_CACHE_DIR = os.getenv('RESERVOIR_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'reservoir', 'refdata'))
+REFDATA_OFFLINE = os.getenv('RESERVOIR_OFFLINE', '') not in ('', '0')
+
+class RefDataEntry(TypedDict):
+  fetchedAt: float
+  data: Any
+
+class RefDataSource(TypedDict):
+  fetch: Callable[[], Any]
+  ttl: float
+
+class RefDataUnavailable(RuntimeError):
+  pass
+
+class RefDataStore:
+  """
+  A store of named reference datasets. Each dataset is memoized in memory,
+  cached on disk for `ttl` seconds, and falls back to a stale cache entry
+  or the snapshot if fetching it fails.
+  """
+  cache_dir: str
+  snapshot_dir: str
+  offline: bool
+  sources: dict[str, RefDataSource]
+
+  def __init__(self, cache_dir: str, snapshot_dir: str, offline: bool = False) -> None:
+    self.cache_dir = cache_dir
+    self.snapshot_dir = snapshot_dir
+    self.offline = offline
+    self.sources = {}
+    self.memo = dict[tuple[str, Any], Any]()
+    self.lock = threading.RLock()
+
+  def register(self, name: str, fetch: Callable[[], Any], ttl: float):
+    self.sources[name] = {'fetch': fetch, 'ttl': ttl}
+
+  def read(self, dir: str, name: str) -> RefDataEntry | None:
+    try:
+      with open(os.path.join(dir, f"{name}.json"), 'r') as f:
+        return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+      return None
+
+  def write(self, dir: str, name: str, entry: RefDataEntry):
+    os.makedirs(dir, exist_ok=True)
+    path = os.path.join(dir, f"{name}.json")
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+      json.dump(entry, f, indent=2)
+      f.write('\n')
+    os.replace(tmp_path, path)
+
+  def fetch(self, name: str) -> RefDataEntry:
+    logging.debug(f"Fetching reference data '{name}'")
+    entry: RefDataEntry = {'fetchedAt': time.time(), 'data': self.sources[name]['fetch']()}
+    self.write(self.cache_dir, name, entry)
+    return entry
+
+  def load(self, name: str) -> Any:
+    """Load the dataset `name`, refreshing the cached copy if it is stale."""
+    if self.offline:
+      entry = self.read(self.snapshot_dir, name)
+      if entry is None:
+        raise RefDataUnavailable(self.missing_message([name]))
+      return entry['data']
+    entry = self.read(self.cache_dir, name)
+    if entry is not None and time.time() - entry['fetchedAt'] < self.sources[name]['ttl']:
+      return entry['data']
+    try:
+      return self.fetch(name)['data']
+    except Exception as e:
+      fallback = entry or self.read(self.snapshot_dir, name)
+      if fallback is None:
+        raise RefDataUnavailable(f"Failed to fetch reference data '{name}' and no cached or snapshot copy exists: {e}") from e
+      logging.warning(f"Failed to refresh reference data '{name}'; using data from {utc_iso_of_timestamp(int(fallback['fetchedAt']))}: {e}")
+      return fallback['data']
+
+  def get(self, name: str, index: Callable[[Any], T] = lambda data: data) -> T:
+    """
+    Get the dataset `name` transformed by `index` (e.g., into a lookup map).
+    The result is memoized for the lifetime of the process.
+    """
+    key = (name, index)
+    with self.lock:
+      if key not in self.memo:
+        self.memo[key] = index(self.load(name))
+      return self.memo[key]
+
+  def missing_message(self, names: Iterable[str]) -> str:
+    return (
+      f"Reference data missing from the offline snapshot in '{self.snapshot_dir}': {', '.join(names)}; "
+      "generate it with `scripts/refdata-snapshot.py` while online (or unset RESERVOIR_OFFLINE)")
+
+  def check_snapshot(self, names: Iterable[str] | None = None) -> bool:
+    """
+    In offline mode, check that the snapshot has the datasets `names` (or all of them),
+    so scripts can fail up front rather than partway through a run.
+    """
+    if not self.offline:
+      return True
+    missing = [name for name in (self.sources.keys() if names is None else names)
+      if not os.path.exists(os.path.join(self.snapshot_dir, f"{name}.json"))]
+    if len(missing) > 0:
+      logging.error(self.missing_message(missing))
+      return False
+    return True
+
+  def save_snapshot(self, names: Iterable[str] | None = None):
+    """Fetch the datasets `names` (or all of them) and save them to the snapshot."""
+    for name in self.sources.keys() if names is None else names:
+      self.write(self.snapshot_dir, name, self.fetch(name))
+      logging.info(f"Saved reference data '{name}' to snapshot")
+
+REFDATA = RefDataStore(REFDATA_CACHE_DIR, REFDATA_SNAPSHOT_DIR, REFDATA_OFFLINE)
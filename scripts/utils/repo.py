@@ -1,44 +1,68 @@
 import os
 import json
+import time
+import hashlib
+import itertools
+import random
 import logging
 import requests
-from typing import Container, Collection, TypedDict, Any
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Container, Collection, TypedDict, Callable, Any
 from utils.index import *
+from utils.refdata import *
 from utils.core import *
 
-REPO_QUERY="""
-query($repoIds: [ID!]!) {
-  nodes(ids: $repoIds) {
-    ... on Repository {
+# The fields of a `Repository` requested by each query profile
+REPO_MINIMAL_FIELDS = """
       id
       nameWithOwner
+      updatedAt
+      pushedAt
+      stargazerCount"""
+REPO_METADATA_FIELDS = """
       description
-      repositoryTopics(first:100) {
-        nodes {
-          topic {
-            name
-          }
-        }
-      }
       licenseInfo {
         spdxId
       }
       createdAt
-      updatedAt
-      pushedAt
       url
       homepageUrl
-      stargazerCount
       defaultBranchRef {
         name
-      }
+      }"""
+REPO_TOPICS_FIELDS = """
+      repositoryTopics(first:%d) {
+        nodes {
+          topic {
+            name
+          }
+        }
+      }"""
+
+REPO_FIELD_PROFILES = {
+  # Enough to detect changes (see `repo_probe_changed`)
+  'minimal': REPO_MINIMAL_FIELDS,
+  # Enough for `metadata_of_repo` (GitHub allows at most 20 topics per repository)
+  'metadata': REPO_MINIMAL_FIELDS + REPO_METADATA_FIELDS + REPO_TOPICS_FIELDS % 20,
+  'full': REPO_MINIMAL_FIELDS + REPO_METADATA_FIELDS + REPO_TOPICS_FIELDS % 100,
+}
+
+def repo_query(profile: str) -> str:
+  return """
+query($repoIds: [ID!]!) {
+  nodes(ids: $repoIds) {
+    ... on Repository {%s
     }
   }
   rateLimit {
     cost
   }
 }
-"""
+""" % REPO_FIELD_PROFILES[profile]
+
+REPO_QUERY = repo_query('full')
 
 class RepoDefaultBranchRef(TypedDict):
   name: str
@@ -72,6 +96,257 @@ class Repo(TypedDict):
   stargazerCount: int
   defaultBranchRef: RepoDefaultBranchRef
 
+class RepoProbe(TypedDict):
+  id: str
+  nameWithOwner: str
+  updatedAt: str
+  pushedAt: str
+  stargazerCount: int
+
+#---
+# Rate limiting
+#---
+
+class RateLimitBudget(TypedDict):
+  limit: int
+  remaining: int
+  reset: int
+
+def github_resource(endpoint: str) -> str:
+  """Guess the rate limit resource that a request to `endpoint` counts against."""
+  if endpoint == 'graphql':
+    return 'graphql'
+  elif endpoint == 'search/code':
+    return 'code_search'
+  elif endpoint.startswith('search/'):
+    return 'search'
+  else:
+    return 'core'
+
+class RateLimitGovernor:
+  """
+  Paces and retries GitHub API requests according to GitHub's rate limits.
+
+  The remaining budget of each rate limit resource (e.g., `core`, `graphql`,
+  `code_search`) is tracked from response headers. Requests are spaced out
+  by a token bucket and, once a resource's budget is exhausted, wait for
+  its reset. Rate limited (403/429) and transiently failing (5xx) requests
+  are retried with jittered exponential backoff.
+  """
+  rate: float
+  burst: float
+  max_retries: int
+  max_wait: float
+  budgets: dict[str, RateLimitBudget]
+  requests: dict[str, int]
+  costs: dict[str, int]
+  retries: int
+  waited: float
+
+  def __init__(self, rate: float = 10, burst: float = 10, max_retries: int = 6, max_wait: float = 3600) -> None:
+    self.rate = rate
+    self.burst = burst
+    self.max_retries = max_retries
+    self.max_wait = max_wait
+    self.budgets = {}
+    self.requests = {}
+    self.costs = {}
+    self.retries = 0
+    self.waited = 0
+    self.tokens = burst
+    self.last_refill = time.monotonic()
+    self.lock = threading.Lock()
+
+  def wait(self, delay: float):
+    if delay <= 0: return
+    with self.lock:
+      self.waited += delay
+    time.sleep(delay)
+
+  def acquire(self, resource: str):
+    """Wait until a request against `resource` may be made."""
+    with self.lock:
+      now = time.monotonic()
+      self.tokens = min(self.burst, self.tokens + (now - self.last_refill) * self.rate)
+      self.last_refill = now
+      self.tokens -= 1
+      delay = 0 if self.tokens >= 0 else -self.tokens / self.rate
+      budget = self.budgets.get(resource, None)
+      if budget is not None:
+        if budget['remaining'] <= 0:
+          reset_delay = budget['reset'] - time.time()
+          if reset_delay > 0:
+            logging.warning(f"GitHub API {resource} rate limit exhausted; waiting until {fmt_timestamp(budget['reset'])}")
+            delay = max(delay, min(reset_delay + random.uniform(1, 5), self.max_wait))
+        budget['remaining'] -= 1
+      self.requests[resource] = self.requests.get(resource, 0) + 1
+    self.wait(delay)
+
+  def update(self, resource: str, budget: RateLimitBudget):
+    with self.lock:
+      self.budgets[resource] = budget
+
+  def update_from_headers(self, resp: requests.Response):
+    """Record the rate limit budget reported in the headers of a response."""
+    resource = resp.headers.get('x-ratelimit-resource', None)
+    try:
+      budget: RateLimitBudget = {
+        'limit': int(resp.headers['x-ratelimit-limit']),
+        'remaining': int(resp.headers['x-ratelimit-remaining']),
+        'reset': int(resp.headers['x-ratelimit-reset']),
+      }
+    except (KeyError, ValueError):
+      return
+    if resource is not None:
+      self.update(resource, budget)
+      used = budget['limit'] - budget['remaining']
+      logging.debug(f"GitHub API usage: {used}/{budget['limit']} of {resource}, resets {fmt_timestamp(budget['reset'])}")
+
+  def add_cost(self, resource: str, cost: int):
+    with self.lock:
+      self.costs[resource] = self.costs.get(resource, 0) + cost
+
+  def retry_delay(self, resp: requests.Response, attempt: int) -> float | None:
+    """
+    Return how long to wait before retrying a request given its response
+    (or `None` if it should not be retried).
+    """
+    if attempt >= self.max_retries:
+      return None
+    backoff = min(2 ** attempt * random.uniform(1, 2), self.max_wait)
+    if resp.status_code in (403, 429):
+      retry_after = resp.headers.get('retry-after', None)
+      if retry_after is not None:
+        delay = float(retry_after)
+      elif resp.headers.get('x-ratelimit-remaining', None) == '0':
+        delay = int(resp.headers.get('x-ratelimit-reset', 0)) - time.time()
+      elif 'rate limit' in resp.text.lower():
+        delay = 60 # secondary rate limits recommend waiting at least a minute
+      else:
+        return None
+      delay = min(max(delay, 0) + backoff, self.max_wait)
+    elif resp.status_code in (502, 503, 504):
+      delay = backoff
+    else:
+      return None
+    with self.lock:
+      self.retries += 1
+    return delay
+
+  def metrics(self) -> dict[str, Any]:
+    with self.lock:
+      return {
+        'requests': dict(self.requests),
+        'costs': dict(self.costs),
+        'retries': self.retries,
+        'waited': round(self.waited, 1),
+        'budgets': dict((k, dict(v)) for k, v in self.budgets.items()),
+      }
+
+  def log_metrics(self):
+    m = self.metrics()
+    if len(m['requests']) == 0: return
+    counts = ', '.join(f"{n} {r}" for r, n in m['requests'].items())
+    logging.info(f"GitHub API requests: {counts}; {m['retries']} retries, {m['waited']}s waiting")
+    for resource, cost in m['costs'].items():
+      logging.info(f"GitHub API {resource} cost: {cost}")
+
+GH_API_GOVERNOR = RateLimitGovernor()
+
+#---
+# Response cache
+#---
+
+class CachedResponse(TypedDict):
+  url: str
+  params: dict[str, Any] | None
+  etag: str | None
+  lastModified: str | None
+  fetchedAt: float
+  content: Any
+
+class ResponseCache:
+  """
+  An on-disk cache of GitHub REST API responses keyed by URL and parameters.
+  Cached responses are revalidated with conditional requests
+  (`If-None-Match` / `If-Modified-Since`), whose `304 Not Modified`
+  responses do not count against GitHub's rate limit.
+
+  Responses younger than `ttl` seconds are used without any request.
+  Responses younger than `ttl + stale_while_revalidate` seconds are used
+  immediately while being revalidated in the background.
+  """
+  dir: str
+  ttl: float
+  stale_while_revalidate: float
+
+  def __init__(self, dir: str, ttl: float = 0, stale_while_revalidate: float = 0) -> None:
+    self.dir = dir
+    self.ttl = ttl
+    self.stale_while_revalidate = stale_while_revalidate
+    self.revalidations = list[threading.Thread]()
+    os.makedirs(dir, exist_ok=True)
+
+  def path(self, url: str, params: dict[str, Any] | None) -> str:
+    key = json.dumps([url, params], sort_keys=True)
+    return os.path.join(self.dir, f"{hashlib.sha256(key.encode()).hexdigest()}.json")
+
+  def get(self, url: str, params: dict[str, Any] | None) -> CachedResponse | None:
+    try:
+      with open(self.path(url, params), 'r') as f:
+        return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+      return None
+
+  def put(self, entry: CachedResponse):
+    path = self.path(entry['url'], entry['params'])
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w') as f:
+      json.dump(entry, f)
+    os.replace(tmp_path, path)
+
+  def store(self, url: str, params: dict[str, Any] | None, resp: requests.Response, content: Any):
+    etag = resp.headers.get('etag', None)
+    last_modified = resp.headers.get('last-modified', None)
+    if etag is None and last_modified is None and self.ttl <= 0:
+      return
+    self.put({
+      'url': url,
+      'params': params,
+      'etag': etag,
+      'lastModified': last_modified,
+      'fetchedAt': time.time(),
+      'content': content,
+    })
+
+  def revalidate_later(self, fn: Callable[[], Any]):
+    def revalidate():
+      try:
+        fn()
+      except Exception as e:
+        logging.warning(f"GitHub API cache revalidation failed: {e}")
+    thread = threading.Thread(target=revalidate)
+    thread.start()
+    self.revalidations.append(thread)
+
+  def join(self):
+    """Wait for any background revalidations to finish."""
+    for thread in self.revalidations:
+      thread.join()
+    self.revalidations.clear()
+
+GH_API_CACHE: ResponseCache | None = None
+
+def configure_github_cache(dir: str | None, ttl: float = 0, stale_while_revalidate: float = 0):
+  global GH_API_CACHE
+  GH_API_CACHE = None if dir is None else ResponseCache(dir, ttl, stale_while_revalidate)
+
+#---
+# Querying
+#---
+
+# May be overridden to point at a stand-in server (e.g., for benchmarking)
+GH_API_URL = os.getenv('GH_API_URL', 'https://api.github.com').rstrip('/')
 GH_API_SESSION = requests.Session()
 GH_API_HEADERS = {
   "User-Agent": "Reservoir",
@@ -83,18 +358,23 @@ GH_TOKEN = os.getenv('GH_TOKEN', None)
 if GH_TOKEN is not None:
   GH_API_HEADERS['Authorization'] = f"Bearer {GH_TOKEN}"
 
-def query_github_api(endpoint: str, fields: dict[str, Any] | None = None, method: str = "GET") -> Any:
-  url=f"https://api.github.com/{endpoint}"
-  if method == "GET":
-    resp = GH_API_SESSION.get(url, params=fields, headers=GH_API_HEADERS)
-  else:
-    resp = GH_API_SESSION.post(url, data=json.dumps(fields), headers=GH_API_HEADERS)
-  resource = resp.headers.get('x-ratelimit-resource', '?')
-  usage = f"{resp.headers.get('x-ratelimit-used', '?')}/{resp.headers.get('x-ratelimit-limit', '?')}"
-  reset = resp.headers.get('x-ratelimit-reset', '?')
-  if reset != '?':
-    reset = fmt_timestamp(int(reset))
-  logging.debug(f"GitHub API usage: {usage} of {resource}, resets {reset}")
+def send_github_request(url: str, resource: str, fields: dict[str, Any] | None, method: str, headers: dict[str, str]):
+  attempt = 0
+  while True:
+    GH_API_GOVERNOR.acquire(resource)
+    if method == "GET":
+      resp = GH_API_SESSION.get(url, params=fields, headers=headers)
+    else:
+      resp = GH_API_SESSION.post(url, data=json.dumps(fields), headers=headers)
+    GH_API_GOVERNOR.update_from_headers(resp)
+    delay = GH_API_GOVERNOR.retry_delay(resp, attempt)
+    if delay is None:
+      return resp
+    logging.warning(f"GitHub API request failed ({resp.status_code}); retrying in {delay:.0f}s")
+    GH_API_GOVERNOR.wait(delay)
+    attempt += 1
+
+def parse_github_response(resp: requests.Response) -> Any:
   try:
     content = resp.json()
   except requests.exceptions.JSONDecodeError:
@@ -103,53 +383,340 @@ def query_github_api(endpoint: str, fields: dict[str, Any] | None = None, method
     raise RuntimeError(f"GitHub API request failed ({resp.status_code}): {content.get('message', resp.text)}")
   return content
 
+def fetch_github_api(url: str, resource: str, fields: dict[str, Any] | None, method: str, cache: ResponseCache | None) -> Any:
+  entry = None if cache is None else cache.get(url, fields)
+  headers = GH_API_HEADERS
+  if entry is not None:
+    headers = dict(headers)
+    if entry['etag'] is not None:
+      headers['If-None-Match'] = entry['etag']
+    if entry['lastModified'] is not None:
+      headers['If-Modified-Since'] = entry['lastModified']
+  resp = send_github_request(url, resource, fields, method, headers)
+  if resp.status_code == 304 and entry is not None and cache is not None:
+    logging.debug(f"GitHub API cache revalidated: {url}")
+    entry['fetchedAt'] = time.time()
+    cache.put(entry)
+    return entry['content']
+  content = parse_github_response(resp)
+  if cache is not None:
+    cache.store(url, fields, resp, content)
+  return content
+
+def query_github_api(endpoint: str, fields: dict[str, Any] | None = None, method: str = "GET", cache: bool = True) -> Any:
+  url=f"{GH_API_URL}/{endpoint}"
+  resource = github_resource(endpoint)
+  response_cache = GH_API_CACHE if cache and method == "GET" else None
+  if response_cache is None:
+    return fetch_github_api(url, resource, fields, method, None)
+  fields = None if fields is None else dict(fields) # callers may reuse `fields` for the next page
+  entry = response_cache.get(url, fields)
+  if entry is not None:
+    age = time.time() - entry['fetchedAt']
+    if age < response_cache.ttl:
+      logging.debug(f"GitHub API cache hit: {url}")
+      return entry['content']
+    if age < response_cache.ttl + response_cache.stale_while_revalidate:
+      logging.debug(f"GitHub API cache hit (revalidating): {url}")
+      response_cache.revalidate_later(lambda: fetch_github_api(url, resource, fields, method, response_cache))
+      return entry['content']
+  return fetch_github_api(url, resource, fields, method, response_cache)
+
+def query_github_pages(endpoint: str, params: dict[str, Any] | None = None) -> Iterator[Any]:
+  """
+  Lazily query the pages of a paginated GitHub REST API endpoint by following
+  the `next` links of its responses. Stopping iteration early skips the rest.
+  """
+  url: str | None = f"{GH_API_URL}/{endpoint}"
+  resource = github_resource(endpoint)
+  while url is not None:
+    resp = send_github_request(url, resource, params, "GET", GH_API_HEADERS)
+    yield parse_github_response(resp)
+    url = resp.links.get('next', {}).get('url', None)
+    params = None # `next` links already include the parameters
+
 def query_github_graphql(query: str, variables: dict) -> Any:
-  return query_github_api("graphql", {"query": query, "variables": variables}, "POST")
-
-def query_github_results(limit: int, endpoint: str, params: dict[str, Any]) -> Iterable[Any]:
-  params['page'] = 1
-  params['per_page'] = 100
-  while limit > 100:
-    res = query_github_api(endpoint, params)
-    yield from res['items']
-    params['page'] += 1
-    limit -= 100
-  if limit != 0:
-    params['per_page'] = limit
-    res = query_github_api(endpoint, params)
-    yield from res['items']
-
-def query_repo_data(items: Iterable[str]) -> Iterable[Repo | None]:
-  for page in paginate(items, 100):
-    data = query_github_graphql(REPO_QUERY, {"repoIds": page})['data']
-    logging.debug(f"GitHub GraphQL request cost: {data['rateLimit']['cost']}")
-    yield from data['nodes']
-
-def query_repos(ids: Iterable[str]) -> dict[str, Repo]:
+  content = query_github_api("graphql", {"query": query, "variables": variables}, "POST")
+  cost = get_type(get_type(content.get('data', None) or {}, 'rateLimit', dict, {}), 'cost', int)
+  if cost is not None:
+    GH_API_GOVERNOR.add_cost('graphql', cost)
+  return content
+
+REPO_PAGE_RETRIES = 3
+
+class AdaptivePageSizer:
+  """
+  Picks how many repository IDs to query per GraphQL request.
+  Sizes grow while requests are fast, shrink proportionally when a request
+  is slower than `target_seconds` or costs more than `max_cost`, and halve
+  when a request times out or returns partial-result errors.
+  """
+  size: int
+  min_size: int
+  max_size: int
+  target_seconds: float
+  max_cost: int
+
+  def __init__(
+      self, size: int = 100, min_size: int = 1, max_size: int = 100,
+      target_seconds: float = 5, max_cost: int = 10
+    ) -> None:
+    self.size = size
+    self.min_size = min_size
+    self.max_size = max_size
+    self.target_seconds = target_seconds
+    self.max_cost = max_cost
+    self.lock = threading.Lock()
+
+  def clamp(self, size: int):
+    self.size = max(self.min_size, min(self.max_size, size))
+
+  def observe(self, size: int, cost: int | None, seconds: float):
+    """Adapt to a successful request for `size` IDs."""
+    with self.lock:
+      scale = 1.0
+      if seconds > self.target_seconds:
+        scale = self.target_seconds / seconds
+      if cost is not None and cost > self.max_cost:
+        scale = min(scale, self.max_cost / cost)
+      if scale < 1:
+        self.clamp(min(self.size, int(size * scale)))
+      elif seconds < self.target_seconds / 2 and size >= self.size:
+        self.clamp(self.size + max(1, self.size // 4))
+
+  def shrink(self, size: int):
+    """Adapt to a failed request for `size` IDs."""
+    with self.lock:
+      self.clamp(min(self.size, size // 2))
+      logging.debug(f"GitHub GraphQL page size reduced to {self.size}")
+
+def failed_node_idxs(content: Any) -> set[int]:
+  """
+  The indices of the `nodes` of a GraphQL response with errors (other than missing repositories).
+  Errors without a node path are not attributed to any node; if they left no `nodes`
+  at all, the caller should treat the whole page as failed.
+  """
+  failed = set[int]()
+  for error in content.get('errors', None) or []:
+    if error.get('type', None) == 'NOT_FOUND':
+      continue
+    path = error.get('path', None) or []
+    if len(path) >= 2 and path[0] == 'nodes' and isinstance(path[1], int):
+      failed.add(path[1])
+  return failed
+
+def query_repo_page(
+    page: list[str], retries: int = REPO_PAGE_RETRIES, query: str = REPO_QUERY,
+    sizer: AdaptivePageSizer | None = None
+  ) -> list[Any | None]:
+  """
+  Query the data of a single page of repository IDs, retrying on failure.
+  Failed requests are retried in smaller batches (as picked by `sizer`),
+  and only the repositories with errors in a partial result are retried.
+  If every attempt fails, the affected repositories are reported as `None`.
+  """
+  sizer = ifnone(sizer, AdaptivePageSizer(len(page)))
+  nodes: list[Any | None] = [None] * len(page)
+  def query_batch(idxs: list[int], attempt: int):
+    start = time.monotonic()
+    try:
+      content = query_github_graphql(query, {"repoIds": [page[i] for i in idxs]})
+      data = content.get('data', None)
+      if data is None or not isinstance(data.get('nodes', None), list):
+        raise RuntimeError(f"no nodes: {content.get('errors', None)}")
+      seconds = time.monotonic() - start
+      cost = get_type(data.get('rateLimit', None) or {}, 'cost', int)
+      logging.debug(f"GitHub GraphQL request for {len(idxs)} repositories cost {cost} in {seconds:.1f}s")
+      failed = failed_node_idxs(content)
+      for i, node in enumerate(data['nodes']):
+        if i not in failed:
+          nodes[idxs[i]] = node
+      retry = [idxs[i] for i in sorted(failed)]
+      if len(retry) > 0:
+        sizer.shrink(len(idxs))
+        reason = f"partial results with {len(retry)} errors"
+      else:
+        sizer.observe(len(idxs), cost, seconds)
+    except (RuntimeError, requests.RequestException) as e:
+      sizer.shrink(len(idxs))
+      retry, reason = idxs, str(e)
+    if len(retry) == 0:
+      return
+    if attempt < retries:
+      delay = 2 ** attempt
+      logging.warning(f"GitHub GraphQL request failed; retrying {len(retry)} repositories in {delay}s: {reason}")
+      time.sleep(delay)
+      for batch in paginate(retry, sizer.size):
+        query_batch(batch, attempt + 1)
+    else:
+      logging.error(f"GitHub GraphQL request failed for {len(retry)} repositories: {reason}")
+  query_batch(list(range(len(page))), 0)
+  return nodes
+
+def query_repo_data(
+    items: Iterable[str], workers: int = 1, profile: str = 'metadata',
+    sizer: AdaptivePageSizer | None = None
+  ) -> Iterable[Any | None]:
+  """
+  Query GitHub for the data of each repository ID in `items`, in order,
+  with the fields of the given query profile.
+  Pages are sized by `sizer` (a fresh `AdaptivePageSizer` by default).
+  If `workers` is greater than 1, up to that many pages are queried concurrently.
+  """
+  query = repo_query(profile)
+  sizer = ifnone(sizer, AdaptivePageSizer())
+  it = iter(items)
+  pages = iter(lambda: list(itertools.islice(it, sizer.size)), [])
+  if workers <= 1:
+    for page in pages:
+      yield from query_repo_page(page, query=query, sizer=sizer)
+  else:
+    # Submit pages as `items` produces them (rather than all upfront like
+    # `executor.map`), so a lazy `items` can overlap with the queries
+    with ThreadPoolExecutor(workers) as executor:
+      futures = deque[Future[list[Any | None]]]()
+      for page in pages:
+        futures.append(executor.submit(query_repo_page, page, query=query, sizer=sizer))
+        if len(futures) >= 2 * workers:
+          yield from futures.popleft().result()
+      while len(futures) > 0:
+        yield from futures.popleft().result()
+
+def query_repos(ids: Iterable[str], workers: int = 1) -> dict[str, Repo]:
+  ids = list(ids)
   repos = dict[str, Repo]()
-  for id, repo in zip(ids, query_repo_data(ids)):
+  for id, repo in zip(ids, query_repo_data(ids, workers)):
     if repo is None:
       logging.error(f"Repository ID '{id}' not found on GitHub")
     else:
       repos[id] = repo
   return repos
 
-def query_lake_repos(limit: int) -> list[str]:
+def query_repo_probes(ids: Iterable[str], workers: int = 1) -> dict[str, RepoProbe]:
+  """Query only the fields of each repository needed to detect whether it has changed."""
+  ids = list(ids)
+  probes = dict[str, RepoProbe]()
+  for id, probe in zip(ids, query_repo_data(ids, workers, 'minimal')):
+    if probe is not None:
+      probes[id] = probe
+  return probes
+
+def repo_probe_changed(pkg: PackageMetadata, probe: RepoProbe) -> bool:
+  """Whether the repository has changed since the package's metadata was last updated from it."""
+  src = github_src(pkg)
+  return (
+    src is None or probe['nameWithOwner'] != src['fullName'] or
+    max(probe['updatedAt'], probe['pushedAt']) > pkg['updatedAt']
+  )
+
+# GitHub returns at most 1000 results for any single code search
+CODE_SEARCH_CAP = 1000
+# GitHub only indexes files smaller than 384 KB for code search
+CODE_SEARCH_MAX_SIZE = 384 * 1024
+
+# Seconds after which a code search checkpoint is too stale to resume
+CODE_SEARCH_CHECKPOINT_TTL = 24*60*60
+
+class CodeSearchCheckpoint(TypedDict):
+  query: str
+  limit: int
+  startedAt: float
+  pending: list[list[int]]
+  repos: dict[str, str]
+
+def load_code_search_checkpoint(path: str | None, query: str, limit: int) -> CodeSearchCheckpoint:
+  if path is not None and os.path.exists(path):
+    with open(path, 'r') as f:
+      checkpoint: CodeSearchCheckpoint = json.load(f)
+    if checkpoint.get('query', None) != query or checkpoint.get('limit', None) != limit:
+      logging.warning(f"Code search checkpoint '{path}' is for a different query or limit; starting over")
+    elif time.time() - checkpoint.get('startedAt', 0) > CODE_SEARCH_CHECKPOINT_TTL:
+      logging.warning(f"Code search checkpoint '{path}' is stale; starting over")
+    else:
+      logging.info(f"Resuming code search with {len(checkpoint['repos'])} repositories and {len(checkpoint['pending'])} pending shards")
+      return checkpoint
+  return {'query': query, 'limit': limit, 'startedAt': time.time(), 'pending': [[0, CODE_SEARCH_MAX_SIZE]], 'repos': {}}
+
+def save_code_search_checkpoint(path: str | None, checkpoint: CodeSearchCheckpoint):
+  if path is None: return
+  tmp_path = f"{path}.tmp"
+  with open(tmp_path, 'w') as f:
+    json.dump(checkpoint, f)
+  os.replace(tmp_path, path)
+
+def search_code_repos(query: str, limit: int = -1, checkpoint_path: str | None = None) -> Iterator[tuple[str, str]]:
+  """
+  Search GitHub code for `query` and lazily yield the node ID and full name
+  of each matching repository (once, and at most `limit` if non-negative).
+
+  To get past the cap on the results of a single search, the search is
+  sharded by file size, halving each shard's size range until it has
+  fewer results than the cap. Progress is saved to `checkpoint_path`
+  after each shard so an interrupted search can be resumed (by a search
+  with the same query and limit within `CODE_SEARCH_CHECKPOINT_TTL`).
+  """
+  checkpoint = load_code_search_checkpoint(checkpoint_path, query, limit)
+  pending = checkpoint['pending']
+  repos = checkpoint['repos']
+  num_yielded = 0
+  def limit_reached():
+    return limit >= 0 and num_yielded >= limit
+  for node_id, name in list(repos.items()):
+    if limit_reached(): break
+    yield node_id, name
+    num_yielded += 1
+  def add_items(items: list[Any]) -> Iterator[tuple[str, str]]:
+    nonlocal num_yielded
+    for item in items:
+      repo = item['repository']
+      if repo['node_id'] not in repos and not limit_reached():
+        repos[repo['node_id']] = repo['full_name']
+        num_yielded += 1
+        yield repo['node_id'], repo['full_name']
+  while len(pending) > 0 and not limit_reached():
+    lo, hi = pending[-1]
+    params = {'q': f"{query} size:{lo}..{hi}", 'per_page': 100, 'page': 1}
+    res = query_github_api("search/code", params)
+    total = res['total_count']
+    if total > CODE_SEARCH_CAP and lo < hi:
+      mid = (lo + hi) // 2
+      logging.debug(f"Splitting code search shard {lo}..{hi} with {total} results")
+      pending.pop()
+      pending.append([mid + 1, hi])
+      pending.append([lo, mid])
+      yield from add_items(res['items'])
+    else:
+      if total > CODE_SEARCH_CAP:
+        logging.warning(f"Code search shard {lo}..{hi} has {total} results; only the first {CODE_SEARCH_CAP} are available")
+      logging.debug(f"Querying code search shard {lo}..{hi} with {total} results")
+      yield from add_items(res['items'])
+      num_pages = (min(total, CODE_SEARCH_CAP) + 99) // 100
+      for page in range(2, num_pages + 1):
+        if limit_reached(): break
+        params['page'] = page
+        yield from add_items(query_github_api("search/code", params)['items'])
+      else:
+        pending.pop()
+    save_code_search_checkpoint(checkpoint_path, checkpoint)
+  # The search is complete (or reached its limit), so there is nothing to resume
+  if checkpoint_path is not None and os.path.exists(checkpoint_path):
+    os.remove(checkpoint_path)
+
+LAKE_MANIFEST_QUERY = 'filename:lake-manifest.json path:/'
+
+def search_lake_repos(limit: int, checkpoint_path: str | None = None) -> Iterator[tuple[str, str]]:
+  """Lazily search for repositories with a root Lake manifest, yielding their node IDs and full names."""
+  resources = query_github_api("rate_limit", cache=False)['resources']
+  for resource, budget in resources.items():
+    GH_API_GOVERNOR.update(resource, budget)
+  rate_limit = resources['code_search']
   # NOTE: For some reason, the GitHub rate limit is currently (07-08-24) off by one.
-  rate_limit = query_github_api("rate_limit")['resources']['code_search']
-  if limit < 0:
-    # NOTE: GitHub limits code searches to 10 requests/min, which is 1000 results.
-    # Thus, the strategy used here will need to change when we hit that limit.
-    limit = (rate_limit['limit']-1)*100
   gh_limit = (rate_limit['remaining']-1)*100
-  if limit > gh_limit:
+  if limit < 0 or limit > gh_limit:
     reset = fmt_timestamp(int(rate_limit['reset']))
-    logging.warning(f"Due to API rate limit, restricted results to a max of {gh_limit} instead of {limit}; resets {reset}")
-    limit = gh_limit
-  logging.debug(f"Querying at most {limit} repositories")
-  query='filename:lake-manifest.json path:/'
-  items = query_github_results(limit, "search/code", {"q": query})
-  return [item['repository']['node_id'] for item in items]
+    logging.info(f"Searching may exceed the API rate limit of {gh_limit} results; searches will be paced until it resets {reset}")
+  logging.debug(f"Querying {'all' if limit < 0 else f'at most {limit}'} repositories")
+  return search_code_repos(LAKE_MANIFEST_QUERY, limit, checkpoint_path)
 
 class License(TypedDict):
   reference: str
@@ -162,17 +729,27 @@ class License(TypedDict):
   isOsiApproved: bool
 
 SPDX_DATA_URL = "https://raw.githubusercontent.com/spdx/license-list-data/main/json/licenses.json"
-def query_licenses(url: str = SPDX_DATA_URL):
+LICENSES_TTL = 7 * 24 * 3600
+
+def fetch_licenses(url: str = SPDX_DATA_URL) -> list[License]:
   logging.debug(f"Fetching SPDX license data from {url}")
   response = requests.get(url, allow_redirects=True)
   if response.status_code != 200:
     raise RuntimeError(f"Failed to fetch SPDX license data ({response.status_code})")
-  license_list: list[License] = json.loads(response.content.decode())['licenses']
+  return json.loads(response.content.decode())['licenses']
+
+def index_licenses(license_list: list[License]) -> dict[str, License]:
   licenses = dict[str, License]()
   for license in license_list:
     licenses[license['licenseId']] = license
   return licenses
 
+LICENSES_REFDATA_NAME = 'spdx-licenses'
+REFDATA.register(LICENSES_REFDATA_NAME, fetch_licenses, LICENSES_TTL)
+
+def query_licenses() -> dict[str, License]:
+  return REFDATA.get(LICENSES_REFDATA_NAME, index_licenses)
+
 def filter_license(license: str | None) -> str | None:
   if filter_ws(license) is None: return None
   if license in ['NONE', 'NOASSERTION']: return None
@@ -243,16 +820,32 @@ def curate_repos(repos: Iterable[Repo], excluded_pkgs: Container[str] = set()) -
 def add_repo_metadata(pkg: Package, repo: Repo):
   pkg.update(cast(Any, metadata_of_repo(repo)))
 
-def query_new_repos(limit: int, indexed_repos: Collection[str], exclusions: Container[str] = set()) -> list[Repo]:
+def query_new_repos(
+    limit: int, indexed_repos: Collection[str], exclusions: Container[str] = set(), workers: int = 1,
+    checkpoint_path: str | None = None
+  ) -> list[Repo]:
+  """
+  Discover notable new repositories with root Lake manifests.
+  Search results are streamed through the pipeline, and repositories
+  already indexed or excluded (by lowercase full name) are dropped
+  before spending any GraphQL budget on them.
+  """
   if limit == 0: return []
   logging.info(f"Searching for new Lean/Lake repositories")
-  repo_ids = query_lake_repos(limit)
-  logging.info(f"{len(repo_ids)} candidate repositories with root Lake manifests")
-  repos = filter(None, query_repo_data(repo_ids))
-  if len(indexed_repos) != 0:
-    repos = [repo for repo in repos if repo['id'] not in indexed_repos]
-    logging.info(f"{len(repos)} candidate repositories not in index")
+  num_candidates = num_new = 0
+  def new_repo_ids():
+    nonlocal num_candidates, num_new
+    for node_id, name in search_lake_repos(limit, checkpoint_path):
+      num_candidates += 1
+      if node_id in indexed_repos or name.lower() in exclusions:
+        continue
+      num_new += 1
+      yield node_id
+  repos = filter(None, query_repo_data(new_repo_ids(), workers))
   repos = list(curate_repos(repos, exclusions))
+  logging.info(f"{num_candidates} candidate repositories with root Lake manifests")
+  if len(indexed_repos) != 0:
+    logging.info(f"{num_new} candidate repositories not in index")
   note = 'notable new' if len(indexed_repos) != 0 else 'notable'
   logging.info(f"{len(repos)} {note} OSI-licensed repositories")
   return repos
@@ -0,0 +1,296 @@
+import json
+import time
+import random
+import hashlib
+import logging
+import threading
+import requests
+from urllib.parse import urlsplit, parse_qsl, urlencode
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import TypedDict, Any
+from utils.core import *
+
+#---
+# GitHub API stand-in
+#---
+
+# A local stand-in for the parts of the GitHub API used by `utils.repo`
+# (REST `search/code` and `rate_limit`, and GraphQL `nodes`), so discovery
+# can be profiled and regression-tested without spending real API quota.
+# Responses are either synthesized from generated repositories or replayed
+# from fixtures recorded by proxying the real API.
+
+STANDIN_LICENSES = ['MIT', 'Apache-2.0', 'GPL-3.0-only', 'BSD-3-Clause', 'CC-BY-4.0']
+
+class StandInRepo(TypedDict):
+  repo: dict[str, Any]
+  manifestSize: int
+
+class RateLimitWindow(TypedDict):
+  limit: int
+  remaining: int
+  reset: int
+  used: int
+
+class Fixture(TypedDict):
+  status: int
+  headers: dict[str, str]
+  content: Any
+
+# Rate limits per resource as (limit, window in seconds)
+STANDIN_RATE_LIMITS = {
+  'core': (5000, 3600),
+  'search': (30, 60),
+  'code_search': (10, 60),
+  'graphql': (5000, 3600),
+}
+
+# The headers of recorded responses worth replaying
+FIXTURE_HEADERS = ('etag', 'last-modified', 'link', 'x-ratelimit-limit', 'x-ratelimit-remaining', 'x-ratelimit-reset', 'x-ratelimit-used', 'x-ratelimit-resource')
+
+def synthesize_repos(count: int, seed: int = 0) -> list[StandInRepo]:
+  """Generate `count` plausible Lean repositories with root Lake manifests."""
+  rng = random.Random(seed)
+  repos = list[StandInRepo]()
+  for i in range(count):
+    owner = f"owner{rng.randrange(max(1, count // 4))}"
+    created = 1_600_000_000 + rng.randrange(100_000_000)
+    updated = created + rng.randrange(10_000_000)
+    license = rng.choice(STANDIN_LICENSES + [None, 'NOASSERTION'])
+    repos.append({
+      'repo': {
+        'id': f"R_kgDO{i:08d}",
+        'nameWithOwner': f"{owner}/lean-pkg{i}",
+        'description': f"Synthetic Lean package {i}",
+        'repositoryTopics': {'nodes': [{'topic': {'name': t}} for t in rng.sample(['lean4', 'math', 'logic', 'tactic', 'ffi'], 2)]},
+        'licenseInfo': None if license is None else {'spdxId': license},
+        'createdAt': utc_iso_of_timestamp(created),
+        'updatedAt': utc_iso_of_timestamp(updated),
+        'pushedAt': utc_iso_of_timestamp(updated + rng.randrange(1_000_000)),
+        'url': f"https://github.com/{owner}/lean-pkg{i}",
+        'homepageUrl': '',
+        'stargazerCount': int(rng.paretovariate(1.2)) - 1,
+        'defaultBranchRef': {'name': 'main'},
+      },
+      'manifestSize': int(rng.lognormvariate(7, 1)),
+    })
+  return repos
+
+def fixture_key(method: str, path: str, body: bytes) -> str:
+  url = urlsplit(path)
+  query = urlencode(sorted(parse_qsl(url.query)))
+  body_hash = hashlib.sha256(body).hexdigest() if len(body) > 0 else ''
+  return f"{method} {url.path}?{query} {body_hash}"
+
+class GitHubStandIn:
+  """
+  A threaded HTTP server impersonating the GitHub API.
+
+  Responses are looked up in `fixtures` first (recording them from `upstream`
+  if set), and are otherwise synthesized from `repos`. Every response carries
+  rate limit headers, and `latency` (mean seconds), `failure_rate`
+  (fraction of 502 responses), `node_latency` (seconds per GraphQL node),
+  and `partial_failure_rate` (fraction of GraphQL nodes with errors)
+  can be injected.
+  """
+  repos: list[StandInRepo]
+  fixtures: dict[str, Fixture]
+  upstream: str | None
+  latency: float
+  failure_rate: float
+  node_latency: float
+  partial_failure_rate: float
+  windows: dict[str, RateLimitWindow]
+  requests: dict[str, int]
+
+  def __init__(
+      self, repos: list[StandInRepo] = [], fixtures: dict[str, Fixture] = {},
+      upstream: str | None = None, latency: float = 0, failure_rate: float = 0,
+      rate_limits: dict[str, tuple[int, int]] = STANDIN_RATE_LIMITS, seed: int = 0,
+      node_latency: float = 0, partial_failure_rate: float = 0
+    ) -> None:
+    self.repos = repos
+    self.repos_by_id = {r['repo']['id']: r['repo'] for r in repos}
+    self.fixtures = dict(fixtures)
+    self.upstream = upstream
+    self.latency = latency
+    self.failure_rate = failure_rate
+    self.node_latency = node_latency
+    self.partial_failure_rate = partial_failure_rate
+    self.rate_limits = rate_limits
+    self.windows = {}
+    self.requests = {}
+    self.rng = random.Random(seed)
+    self.lock = threading.Lock()
+    self.server: ThreadingHTTPServer | None = None
+    self.url = ''
+
+  #---
+  # Lifecycle
+  #---
+
+  def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+    """Start serving in a background thread. Returns the server's base URL."""
+    standin = self
+    class Handler(BaseHTTPRequestHandler):
+      def do_GET(self):
+        standin.handle(self, 'GET')
+      def do_POST(self):
+        standin.handle(self, 'POST')
+      def log_message(self, format: str, *args: Any):
+        logging.debug(f"Stand-in: {format % args}")
+    self.server = ThreadingHTTPServer((host, port), Handler)
+    self.server.daemon_threads = True
+    self.url = f"http://{host}:{self.server.server_address[1]}"
+    threading.Thread(target=self.server.serve_forever, daemon=True).start()
+    logging.info(f"GitHub API stand-in serving {len(self.repos)} repositories and {len(self.fixtures)} fixtures at {self.url}")
+    return self.url
+
+  def stop(self):
+    if self.server is not None:
+      self.server.shutdown()
+      self.server.server_close()
+      self.server = None
+
+  def save_fixtures(self, path: str):
+    with open(path, 'w') as f:
+      json.dump(self.fixtures, f, indent=2)
+
+  @staticmethod
+  def load_fixtures(path: str) -> dict[str, Fixture]:
+    with open(path, 'r') as f:
+      return json.load(f)
+
+  #---
+  # Rate limits
+  #---
+
+  def window(self, resource: str) -> RateLimitWindow:
+    limit, period = self.rate_limits.get(resource, STANDIN_RATE_LIMITS['core'])
+    now = int(time.time())
+    window = self.windows.get(resource, None)
+    if window is None or now >= window['reset']:
+      window = self.windows[resource] = {'limit': limit, 'remaining': limit, 'reset': now + period, 'used': 0}
+    return window
+
+  def charge(self, resource: str) -> tuple[bool, dict[str, str]]:
+    """Charge a request against `resource`. Returns whether it is allowed and its rate limit headers."""
+    with self.lock:
+      self.requests[resource] = self.requests.get(resource, 0) + 1
+      window = self.window(resource)
+      allowed = window['remaining'] > 0
+      if allowed:
+        window['remaining'] -= 1
+        window['used'] += 1
+      return allowed, {
+        'x-ratelimit-limit': str(window['limit']),
+        'x-ratelimit-remaining': str(window['remaining']),
+        'x-ratelimit-reset': str(window['reset']),
+        'x-ratelimit-used': str(window['used']),
+        'x-ratelimit-resource': resource,
+      }
+
+  #---
+  # Requests
+  #---
+
+  def handle(self, req: BaseHTTPRequestHandler, method: str):
+    body = req.rfile.read(int(req.headers.get('content-length', 0) or 0))
+    if self.latency > 0:
+      time.sleep(self.rng.uniform(0, 2 * self.latency))
+    url = urlsplit(req.path)
+    endpoint = url.path.strip('/')
+    if self.failure_rate > 0 and self.rng.random() < self.failure_rate:
+      self.respond(req, 502, {}, {'message': 'Server Error'})
+      return
+    key = fixture_key(method, req.path, body)
+    fixture = self.fixtures.get(key, None)
+    if fixture is None and self.upstream is not None:
+      fixture = self.fixtures[key] = self.record(req, method, body)
+    if fixture is not None:
+      headers = dict(fixture['headers'])
+      if 'link' in headers and self.upstream is not None:
+        headers['link'] = headers['link'].replace(self.upstream, self.url)
+      self.respond(req, fixture['status'], headers, fixture['content'])
+      return
+    if endpoint == 'rate_limit':
+      with self.lock:
+        resources = {r: dict(self.window(r)) for r in self.rate_limits.keys()}
+      self.respond(req, 200, {}, {'resources': resources, 'rate': resources['core']})
+      return
+    if endpoint == 'licenses.json':
+      self.respond(req, 200, {}, {'licenses': [
+        {'licenseId': id, 'name': id, 'reference': '', 'detailsUrl': '', 'referenceNumber': i,
+         'seeAlso': [], 'isDeprecatedLicenseId': False, 'isOsiApproved': id != 'CC-BY-4.0'}
+        for i, id in enumerate(STANDIN_LICENSES)
+      ]})
+      return
+    resource = {'graphql': 'graphql', 'search/code': 'code_search'}.get(endpoint, 'core')
+    allowed, headers = self.charge(resource)
+    if not allowed:
+      self.respond(req, 403, headers, {'message': f"API rate limit exceeded for {resource}"})
+    elif endpoint == 'search/code' and method == 'GET':
+      self.respond(req, *self.search_code(dict(parse_qsl(url.query)), headers))
+    elif endpoint == 'graphql' and method == 'POST':
+      self.respond(req, 200, headers, self.graphql(json.loads(body)))
+    else:
+      self.respond(req, 404, headers, {'message': 'Not Found'})
+
+  def respond(self, req: BaseHTTPRequestHandler, status: int, headers: dict[str, str], content: Any):
+    data = json.dumps(content).encode()
+    req.send_response(status)
+    req.send_header('content-type', 'application/json; charset=utf-8')
+    req.send_header('content-length', str(len(data)))
+    for name, value in headers.items():
+      req.send_header(name, value)
+    req.end_headers()
+    req.wfile.write(data)
+
+  def record(self, req: BaseHTTPRequestHandler, method: str, body: bytes) -> Fixture:
+    headers = {k: v for k, v in req.headers.items() if k.lower() not in ('host', 'content-length', 'accept-encoding')}
+    url = f"{self.upstream}{req.path}"
+    logging.info(f"Stand-in: recording {method} {url}")
+    resp = requests.request(method, url, data=body or None, headers=headers)
+    return {
+      'status': resp.status_code,
+      'headers': {k: v for k, v in resp.headers.items() if k.lower() in FIXTURE_HEADERS},
+      'content': resp.json(),
+    }
+
+  def search_code(self, params: dict[str, str], headers: dict[str, str]) -> tuple[int, dict[str, str], Any]:
+    lo, hi = 0, 2**63
+    for term in params.get('q', '').split():
+      if term.startswith('size:'):
+        bounds = term.removeprefix('size:').split('..')
+        lo, hi = int(bounds[0]), int(bounds[-1])
+    matches = [r for r in self.repos if lo <= r['manifestSize'] <= hi]
+    per_page = int(params.get('per_page', 30))
+    page = int(params.get('page', 1))
+    if page * per_page > 1000:
+      return 422, headers, {'message': 'Only the first 1000 search results are available'}
+    items = [
+      {'name': 'lake-manifest.json', 'path': 'lake-manifest.json', 'repository': {
+        'node_id': r['repo']['id'], 'full_name': r['repo']['nameWithOwner'],
+      }}
+      for r in matches[(page - 1) * per_page:page * per_page]
+    ]
+    return 200, headers, {'total_count': len(matches), 'incomplete_results': False, 'items': items}
+
+  def graphql(self, body: dict[str, Any]) -> Any:
+    ids = body.get('variables', {}).get('repoIds', [])
+    if self.node_latency > 0:
+      time.sleep(self.node_latency * len(ids))
+    nodes = list[Any]()
+    errors = list[Any]()
+    for i, id in enumerate(ids):
+      with self.lock:
+        failed = self.partial_failure_rate > 0 and self.rng.random() < self.partial_failure_rate
+      if failed:
+        nodes.append(None)
+        errors.append({'message': 'Something went wrong while executing your query. This may be the result of a timeout.', 'path': ['nodes', i]})
+      else:
+        nodes.append(self.repos_by_id.get(id, None))
+    content: dict[str, Any] = {'data': {'nodes': nodes, 'rateLimit': {'cost': 1}}}
+    if len(errors) > 0:
+      content['errors'] = errors
+    return content
@@ -0,0 +1,151 @@
+import sys
+import base64
+from array import array
+from typing import Iterable, Any
+from utils.package import *
+
+# Tri-state booleans are packed into 2 bits each
+TRI_STATE_CODES = {None: 0, False: 1, True: 2}
+TRI_STATE_VALUES = (None, False, True)
+
+def pack_outcome(build: BuildResult) -> int:
+  return (
+    TRI_STATE_CODES[build['built']] |
+    TRI_STATE_CODES[build['tested']] << 2 |
+    TRI_STATE_CODES[build.get('requiredUpdate', None)] << 4
+  )
+
+def unpack_outcome(code: int) -> tuple[bool | None, bool | None, bool | None]:
+  return TRI_STATE_VALUES[code & 3], TRI_STATE_VALUES[(code >> 2) & 3], TRI_STATE_VALUES[(code >> 4) & 3]
+
+def encode_array(arr: array) -> str:
+  """Base64-encode an array's items in little-endian byte order."""
+  if sys.byteorder != 'little':
+    arr = array(arr.typecode, arr)
+    arr.byteswap()
+  return base64.b64encode(arr.tobytes()).decode()
+
+def encode_bitset(bits: int) -> str:
+  """Base64-encode a bitset in little-endian byte order."""
+  return base64.b64encode(bits.to_bytes((bits.bit_length() + 7) // 8, 'little')).decode()
+
+class Dictionary:
+  """A dictionary encoding of values as their index in `values`."""
+  values: list[Any]
+  idxs: dict[Any, int]
+
+  def __init__(self) -> None:
+    self.values = []
+    self.idxs = {}
+
+  def encode(self, value: Any) -> int:
+    idx = self.idxs.get(value, None)
+    if idx is None:
+      idx = self.idxs[value] = len(self.values)
+      self.values.append(value)
+    return idx
+
+class BuildTable:
+  """
+  A columnar table of the builds of many packages.
+  Toolchains, revisions, and URLs are dictionary-encoded, and the
+  `built`, `tested`, and `requiredUpdate` outcomes are packed into one byte.
+  """
+  packages: list[str]
+  toolchains: Dictionary
+  revisions: Dictionary
+  urls: Dictionary
+  package_col: array
+  toolchain_col: array
+  revision_col: array
+  url_col: array
+  outcome_col: array
+  archive_size_col: array
+  archive_hash_col: list[str | None]
+  run_at_col: list[str]
+
+  def __init__(self) -> None:
+    self.packages = []
+    self.toolchains = Dictionary()
+    self.revisions = Dictionary()
+    self.urls = Dictionary()
+    self.package_col = array('I')
+    self.toolchain_col = array('I')
+    self.revision_col = array('I')
+    self.url_col = array('I')
+    self.outcome_col = array('B')
+    self.archive_size_col = array('q')
+    self.archive_hash_col = []
+    self.run_at_col = []
+
+  def __len__(self) -> int:
+    return len(self.outcome_col)
+
+  def add_package(self, name: str, builds: Iterable[Build]) -> int:
+    """Add a package and its builds to the table. Returns the package's index."""
+    pkg_idx = len(self.packages)
+    self.packages.append(name)
+    for build in builds:
+      self.package_col.append(pkg_idx)
+      self.toolchain_col.append(self.toolchains.encode(build['toolchain']))
+      self.revision_col.append(self.revisions.encode(build['revision']))
+      self.url_col.append(self.urls.encode(build.get('url', None)))
+      self.outcome_col.append(pack_outcome(build))
+      self.archive_size_col.append(ifnone(build.get('archiveSize', None), -1))
+      self.archive_hash_col.append(build.get('archiveHash', None))
+      self.run_at_col.append(build['runAt'])
+    return pkg_idx
+
+  def build(self, idx: int) -> Build:
+    """Decode the build at row `idx`."""
+    built, tested, required_update = unpack_outcome(self.outcome_col[idx])
+    archive_size = self.archive_size_col[idx]
+    return {
+      'built': built,
+      'tested': tested,
+      'toolchain': self.toolchains.values[self.toolchain_col[idx]],
+      'requiredUpdate': required_update,
+      'archiveSize': None if archive_size < 0 else archive_size,
+      'archiveHash': self.archive_hash_col[idx],
+      'runAt': self.run_at_col[idx],
+      'url': self.urls.values[self.url_col[idx]],
+      'revision': self.revisions.values[self.revision_col[idx]],
+    }
+
+  def compatibility(self) -> list[int]:
+    """
+    Compute, for each toolchain (by index), the bitset of packages (by index)
+    with at least one successful build on it.
+    """
+    num_bytes = (len(self.packages) + 7) // 8
+    compat = [bytearray(num_bytes) for _ in self.toolchains.values]
+    built_code = TRI_STATE_CODES[True]
+    for pkg_idx, toolchain_idx, outcome in zip(self.package_col, self.toolchain_col, self.outcome_col):
+      if outcome & 3 == built_code:
+        compat[toolchain_idx][pkg_idx >> 3] |= 1 << (pkg_idx & 7)
+    return [int.from_bytes(bits, 'little') for bits in compat]
+
+  def serialize(self) -> dict[str, Any]:
+    return {
+      'packages': self.packages,
+      'toolchains': self.toolchains.values,
+      'revisions': self.revisions.values,
+      'urls': self.urls.values,
+      'columns': {
+        'package': encode_array(self.package_col),
+        'toolchain': encode_array(self.toolchain_col),
+        'revision': encode_array(self.revision_col),
+        'url': encode_array(self.url_col),
+        'outcome': encode_array(self.outcome_col),
+        'archiveSize': encode_array(self.archive_size_col),
+        'archiveHash': self.archive_hash_col,
+        'runAt': self.run_at_col,
+      },
+    }
+
+  def serialize_compatibility(self) -> dict[str, Any]:
+    return {
+      'packages': self.packages,
+      'toolchains': self.toolchains.values,
+      'built': list(map(encode_bitset, self.compatibility())),
+    }
@@ -1,7 +1,8 @@
 import re
-import json
-from typing import TypedDict
+from typing import TypedDict, Callable
 from utils.core import *
+from utils.refdata import *
+from utils.repo import query_github_pages
 
 class Release(TypedDict):
   tag_name: str
@@ -11,15 +12,35 @@ class Release(TypedDict):
 
 DEFAULT_ORIGIN = 'leanprover/lean4'
 
-def query_releases(repo: str = DEFAULT_ORIGIN, paginate: bool = True) -> 'Iterator[Release]':
-  out = capture_cmd(
-    'gh', 'api',
-    '--cache', '1h',
-    f'repos/{repo}/releases',
-    *(['--paginate'] if paginate else []),
-    '-q', '.[]'
-  )
-  return map(json.loads, out.decode().splitlines())
+def query_releases(repo: str = DEFAULT_ORIGIN, page_size: int = 100) -> 'Iterator[Release]':
+  """
+  Lazily query the releases of `repo` from newest to oldest, a page at a time,
+  so consumers which stop early (e.g., at the first stable release) only fetch
+  the pages they need.
+  """
+  for page in query_github_pages(f'repos/{repo}/releases', {'per_page': page_size}):
+    for rel in page:
+      yield {
+        'tag_name': rel['tag_name'],
+        'published_at': rel['published_at'],
+        'html_url': rel['html_url'],
+        'prerelease': rel['prerelease'],
+      }
+
+RELEASES_TTL = 3600
+
+def releases_refdata_name(repo: str):
+  return f"releases-{repo.replace('/', '-')}"
+
+def register_releases(repo: str):
+  REFDATA.register(releases_refdata_name(repo), lambda: list(query_releases(repo)), RELEASES_TTL)
+
+def cached_releases(repo: str = DEFAULT_ORIGIN) -> 'list[Release]':
+  """Like `query_releases`, but served (in full) from the reference data store."""
+  name = releases_refdata_name(repo)
+  if name not in REFDATA.sources:
+    register_releases(repo)
+  return REFDATA.get(name)
 
 class Toolchain(TypedDict):
   name: str
@@ -45,6 +66,9 @@ def lean_version_number(tag: str):
   return int(match.group(1)) if match is not None else None
 
 def query_toolchains(repo: str = DEFAULT_ORIGIN) -> 'list[Toolchain]':
+  return toolchains_of_releases(repo, cached_releases(repo))
+
+def toolchains_of_releases(repo: str, releases: 'Iterable[Release]') -> 'list[Toolchain]':
   def toolchain_of_release(rel: Release) -> Toolchain:
     return {
       "name": f"{repo}:{rel['tag_name']}",
@@ -54,7 +78,7 @@ def query_toolchains(repo: str = DEFAULT_ORIGIN) -> 'list[Toolchain]':
       "releaseUrl": rel['html_url'],
       "prerelease": rel['prerelease']
     }
-  toolchains = map(toolchain_of_release, query_releases(repo))
+  toolchains = map(toolchain_of_release, releases)
   return sorted(toolchains, key=toolchain_sort_key, reverse=True)
 
 def normalize_toolchain(toolchain: str) -> str:
@@ -71,18 +95,41 @@ def normalize_toolchain(toolchain: str) -> str:
 
 NIGHTLY_REPO='leanprover/lean4-nightly'
 
+# Toolchain aliases resolve to the tag of the newest release of a repository matching a predicate
+TOOLCHAIN_ALIASES: dict[str, tuple[str, Callable[[Release], bool]]] = {
+  'stable': (DEFAULT_ORIGIN, lambda rel: not rel['prerelease']),
+  'latest': (DEFAULT_ORIGIN, lambda rel: True),
+  'nightly': (NIGHTLY_REPO, lambda rel: True),
+}
+
+# Most aliases match one of the first few releases
+ALIAS_RELEASES_PAGE_SIZE = 10
+
+def find_release_tag(repo: str, pred: Callable[[Release], bool]) -> str:
+  for rel in query_releases(repo, ALIAS_RELEASES_PAGE_SIZE):
+    if pred(rel):
+      return rel['tag_name']
+  raise RuntimeError(f"No matching release of '{repo}'")
+
+def register_toolchain_aliases():
+  def register(alias: str, repo: str, pred: Callable[[Release], bool]):
+    REFDATA.register(f'toolchain-{alias}', lambda: find_release_tag(repo, pred), RELEASES_TTL)
+  for alias, (repo, pred) in TOOLCHAIN_ALIASES.items():
+    register(alias, repo, pred)
+
+register_releases(DEFAULT_ORIGIN)
+register_toolchain_aliases()
+
+def toolchain_refdata_names(toolchains: Iterable[str]) -> list[str]:
+  """The reference datasets needed to resolve `toolchains` (i.e., those of its aliases)."""
+  return [f'toolchain-{t}' for t in split_toolchains(toolchains) if t in TOOLCHAIN_ALIASES]
+
 def resolve_toolchain(toolchain: str, package_toolchain: T) -> str | T:
   if toolchain == 'package':
     return package_toolchain
-  elif toolchain == 'stable':
-    releases = filter(lambda r: not r['prerelease'], query_releases())
-    return f"{DEFAULT_ORIGIN}:{next(releases)['tag_name']}"
-  elif toolchain == 'nightly':
-    releases = query_releases(NIGHTLY_REPO, paginate=False)
-    return f"{DEFAULT_ORIGIN}:{next(releases)['tag_name']}"
-  elif toolchain == 'latest':
-    releases = query_releases(paginate=False)
-    return f"{DEFAULT_ORIGIN}:{next(releases)['tag_name']}"
+  elif toolchain in TOOLCHAIN_ALIASES:
+    # `REFDATA` memoizes the tag, so each alias is only resolved once per run
+    return f"{DEFAULT_ORIGIN}:{REFDATA.get(f'toolchain-{toolchain}')}"
   else:
     return normalize_toolchain(toolchain)
 